@@ -0,0 +1,452 @@
+# benchmark.py
+
+import os
+import gc
+import sys
+import copy
+import random
+import json
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+# Created with --save-baseline on the reference machine, with the pinned
+# requirements installed and the tiktoken encoding in fixtures/tiktoken
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "src"))
+
+# Caches would turn repeated runs into cache hits, and reports are kept in
+# memory only; set before the app modules read them at import time.
+# tiktoken reads its encoding from the fixture directory, since the network
+# is blocked; fill it once with --fetch-tokenizer and commit the file.
+BENCHMARK_ENV = {
+    "LITSCOUT_SEARCH_CACHE": "0",
+    "LITSCOUT_EMBEDDING_CACHE": "0",
+    "LITSCOUT_RESPONSE_CACHE": "0",
+    "LITSCOUT_VECTOR_STORE": "numpy",
+    "LITSCOUT_REPORT_DIR": "",
+    "LITSCOUT_CACHE_DIR": os.path.join(tempfile.gettempdir(), "litscout-benchmark"),
+    "TIKTOKEN_CACHE_DIR": os.path.join(FIXTURE_DIR, "tiktoken"),
+}
+os.environ.update(BENCHMARK_ENV)
+
+from fake_clients import FakeChatClient, FakeEmbeddings
+from chatgpt_functions import (
+    build_summary_messages, generate_summary, index_documents, prepare_documents_for_embedding,
+    register_client, retrieve_relevant_context
+)
+from context_functions import CONTEXT_CANDIDATES, get_encoder
+from dedupe_functions import dedupe_articles
+from document_functions import create_word_doc_from_json
+from search_function import (
+    ATOM_ENTRY_TAG, ATOM_NS, _openaire_results_list, _parse_arxiv_feed,
+    _parse_openaire_result, _parse_pubmed_articles
+)
+from vector_store_functions import unique_documents
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_REPEATS = 5
+
+# Year filter wide enough to keep every fixture entry
+DATE_RANGE = (1900, 2100)
+
+# Query stages time single queries, so they take at least this many samples
+QUERY_SAMPLES = 50
+QUERIES = (
+    "retrieval augmented generation faithfulness",
+    "dense passage retrieval index compression",
+    "systematic review screening automation",
+    "energy cost of embedding pipelines",
+    "question answering over knowledge graphs",
+)
+
+# A metric regresses when it exceeds the baseline by more than the tolerance
+# and by more than these absolute amounts, which absorb timer and allocator noise
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_MS = 1.0
+MIN_REGRESSION_MB = 0.5
+
+def _block_network():
+    """
+    Make any attempt to reach the network fail loudly
+    """
+    def refuse(*args, **kwargs):
+        raise OSError("Network access is disabled while benchmarking")
+    socket.socket.connect = refuse
+    socket.getaddrinfo = refuse
+
+def _fixture_path(name):
+    return os.path.join(FIXTURE_DIR, name)
+
+# Words for per-copy subtitles
+SUBTITLE_WORDS = (
+    "adaptive", "benchmark", "clinical", "corpus", "dense", "evaluation", "federated",
+    "graph", "hybrid", "indexing", "latency", "multilingual", "neural", "ontology",
+    "pipeline", "quantised", "ranking", "robust", "scalable", "semantic", "sparse",
+    "streaming", "temporal", "transfer", "uncertainty", "vector", "weighted", "zero-shot",
+)
+
+def _vary(text, i):
+    # Give every copy distinct text so its chunks are not deduplicated away
+    return f"{(text or '').replace('. ', f'. ({i}) ')} (record {i})"
+
+def _vary_title(title, i):
+    # A random subtitle keeps copies below dedupe_articles' title similarity threshold
+    return f"{title}: {' '.join(random.Random(i).sample(SUBTITLE_WORDS, 6))} ({i})"
+
+def _copies(templates, size):
+    for i in range(size):
+        yield i, copy.deepcopy(templates[i % len(templates)])
+
+@lru_cache(maxsize=None)
+def arxiv_payload(size):
+    """
+    ArXiv Atom feed with size entries, cycled from the recorded fixture
+    """
+    ET.register_namespace('', ATOM_NS['atom'])
+    ET.register_namespace('arxiv', ATOM_NS['arxiv'])
+    root = ET.parse(_fixture_path("arxiv_atom.xml")).getroot()
+    entries = root.findall(ATOM_ENTRY_TAG)
+    for entry in entries:
+        root.remove(entry)
+    for i, entry in _copies(entries, size):
+        entry.find('atom:id', ATOM_NS).text = f"http://arxiv.org/abs/{2400 + i // 100000}.{i % 100000:05d}v1"
+        title = entry.find('atom:title', ATOM_NS)
+        title.text = _vary_title(title.text, i)
+        summary = entry.find('atom:summary', ATOM_NS)
+        summary.text = _vary(summary.text, i)
+        for doi in entry.findall('arxiv:doi', ATOM_NS):
+            doi.text += f".{i}"
+        root.append(entry)
+    return ET.tostring(root, encoding="utf-8")
+
+@lru_cache(maxsize=None)
+def pubmed_payload(size):
+    """
+    PubMed efetch XML with size articles, cycled from the recorded fixture
+    """
+    root = ET.parse(_fixture_path("pubmed_efetch.xml")).getroot()
+    articles = root.findall("PubmedArticle")
+    for article in articles:
+        root.remove(article)
+    for i, article in _copies(articles, size):
+        article.find("MedlineCitation/PMID").text = str(40000000 + i)
+        title = article.find("MedlineCitation/Article/ArticleTitle")
+        title.text = _vary_title(title.text, i)
+        for abstract in article.findall("MedlineCitation/Article/Abstract/AbstractText"):
+            abstract.text = _vary(abstract.text, i)
+        for doi in article.findall("PubmedData/ArticleIdList/ArticleId[@IdType='doi']"):
+            doi.text += f".{i}"
+        root.append(article)
+    return ET.tostring(root, encoding="utf-8")
+
+@lru_cache(maxsize=None)
+def openaire_payload(size):
+    """
+    OpenAIRE JSON response with size results, cycled from the recorded fixture
+    """
+    with open(_fixture_path("openaire.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    results = data['response']['results']['result']
+    data['response']['results']['result'] = copied = []
+    for i, result in _copies(results, size):
+        fields = result['metadata']['oaf:entity']['oaf:result']
+        fields['title'][0]['$'] = _vary_title(fields['title'][0]['$'], i)
+        fields['description'][0]['$'] = _vary(fields['description'][0]['$'], i)
+        for pid in fields.get('pid', []):
+            pid['$'] += f".{i}"
+        copied.append(result)
+    return json.dumps(data).encode("utf-8")
+
+def parse_openaire(payload):
+    results = _openaire_results_list(json.loads(payload))
+    return [article for article in map(_parse_openaire_result, results) if article is not None]
+
+def source_payloads(size):
+    """
+    ArXiv, PubMed and OpenAIRE payloads holding size records between them
+    """
+    arxiv, pubmed, openaire = (size // 3 + (i < size % 3) for i in range(3))
+    return arxiv_payload(arxiv), pubmed_payload(pubmed), openaire_payload(openaire)
+
+def parse_payloads(payloads):
+    arxiv, pubmed, openaire = payloads
+    return _parse_arxiv_feed(arxiv, DATE_RANGE)[0] + _parse_pubmed_articles(pubmed) + parse_openaire(openaire)
+
+@lru_cache(maxsize=None)
+def make_articles(size):
+    """
+    size articles parsed from all three sources
+    """
+    return tuple(parse_payloads(source_payloads(size)))
+
+def make_report(articles, response):
+    return {
+        'research_topic': QUERIES[0],
+        'response': response,
+        'articles': list(articles),
+        'citation_format': 'APA'
+    }
+
+def build_store(articles):
+    docs, ids = unique_documents(prepare_documents_for_embedding(articles))
+    return index_documents(docs, ids, backend="numpy"), len(docs)
+
+def _query_cycle():
+    position = 0
+    def next_query():
+        nonlocal position
+        position += 1
+        return QUERIES[position % len(QUERIES)]
+    return next_query
+
+# Each benchmark takes a size, does its setup, and returns a function that
+# runs the measured work once and returns the number of items it processed
+
+def bench_search_arxiv(size):
+    payload = arxiv_payload(size)
+    return lambda: len(_parse_arxiv_feed(payload, DATE_RANGE)[0])
+
+def bench_search_pubmed(size):
+    payload = pubmed_payload(size)
+    return lambda: len(_parse_pubmed_articles(payload))
+
+def bench_search_openaire(size):
+    payload = openaire_payload(size)
+    return lambda: len(parse_openaire(payload))
+
+def bench_prepare_documents(size):
+    articles = make_articles(size)
+    def run():
+        prepare_documents_for_embedding(articles)
+        return len(articles)
+    return run
+
+def bench_vector_upsert(size):
+    docs, ids = unique_documents(prepare_documents_for_embedding(make_articles(size)))
+    def run():
+        index_documents(docs, ids, backend="numpy")
+        return len(docs)
+    return run
+
+def bench_vector_query(size):
+    store, _ = build_store(make_articles(size))
+    next_query = _query_cycle()
+    def run():
+        store.similarity_search(next_query(), k=CONTEXT_CANDIDATES)
+        return 1
+    return run
+
+def bench_retrieve_context(size):
+    store, _ = build_store(make_articles(size))
+    next_query = _query_cycle()
+    def run():
+        retrieve_relevant_context(store, next_query())
+        return 1
+    return run
+
+def bench_create_docx(size):
+    report = make_report(make_articles(size), generate_summary(build_summary_messages(QUERIES[0], "")))
+    def run():
+        if not create_word_doc_from_json(report):
+            raise RuntimeError("create_word_doc_from_json failed")
+        return size
+    return run
+
+def bench_end_to_end(size):
+    payloads = source_payloads(size)
+    def run():
+        articles = dedupe_articles(parse_payloads(payloads))
+        store, _ = build_store(articles)
+        context = retrieve_relevant_context(store, QUERIES[0])
+        response = generate_summary(build_summary_messages(QUERIES[0], context))
+        if not create_word_doc_from_json(make_report(articles, response)):
+            raise RuntimeError("create_word_doc_from_json failed")
+        return len(articles)
+    return run
+
+# name: (benchmark, minimum number of timed samples)
+BENCHMARKS = {
+    "search_arxiv": (bench_search_arxiv, 1),
+    "search_pubmed": (bench_search_pubmed, 1),
+    "search_openaire": (bench_search_openaire, 1),
+    "prepare_documents": (bench_prepare_documents, 1),
+    "vector_upsert": (bench_vector_upsert, 1),
+    "vector_query": (bench_vector_query, QUERY_SAMPLES),
+    "retrieve_context": (bench_retrieve_context, QUERY_SAMPLES),
+    "create_docx": (bench_create_docx, 1),
+    "end_to_end": (bench_end_to_end, 1),
+}
+
+def measure(benchmark, size, repeats=DEFAULT_REPEATS, warmup=1, min_samples=1):
+    """
+    Time repeated runs of a benchmark at one size, then trace one more run
+    for peak memory. Returns latency percentiles, throughput and peak memory.
+    """
+    run = benchmark(size)
+    for _ in range(warmup):
+        run()
+
+    samples = []
+    items = 0
+    for _ in range(max(repeats, min_samples)):
+        started = time.perf_counter()
+        items = run()
+        samples.append(time.perf_counter() - started)
+
+    # Tracing slows allocation down, so memory is measured on its own run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {
+        'items': items,
+        'samples': len(samples),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'items_per_s': items / (p50 / 1000) if p50 else float('inf'),
+        'peak_mb': peak / 2 ** 20
+    }
+
+def result_key(stage, size):
+    return f"{stage}@{size}"
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Messages for every median latency or peak memory that grew past the
+    baseline by more than tolerance
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric, floor in (('p50_ms', MIN_REGRESSION_MS), ('peak_mb', MIN_REGRESSION_MB)):
+            if result[metric] > base[metric] * (1 + tolerance) and result[metric] - base[metric] > floor:
+                regressions.append(
+                    f"{key} {metric}: {result[metric]:.2f} vs baseline {base[metric]:.2f} "
+                    f"(+{result[metric] / base[metric] - 1:.0%})"
+                )
+    return regressions
+
+def tokenizer_mode():
+    """
+    'tiktoken' when the encoding loaded, 'estimate' when token counts fall
+    back to length; timings from the two modes are not comparable
+    """
+    return 'tiktoken' if get_encoder() is not None else 'estimate'
+
+def load_baseline(path):
+    """
+    (tokenizer mode, results) of a baseline file, or None if there is none
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get('tokenizer', 'tiktoken'), data['results']
+
+def save_baseline(path, results, tokenizer):
+    """
+    Merge results into the baseline file, keeping entries not re-measured.
+    Entries measured with another tokenizer mode are dropped.
+    """
+    previous = load_baseline(path)
+    kept = previous[1] if previous and previous[0] == tokenizer else {}
+    merged = dict(kept, **results)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'tokenizer': tokenizer, 'results': dict(sorted(merged.items()))}, f, indent=2)
+        f.write("\n")
+
+def print_result(stage, size, result):
+    print(
+        f"{stage:18} {size:>6} {result['items']:>7} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+        f"{result['p99_ms']:>10.2f} {result['items_per_s']:>11.0f} {result['peak_mb']:>9.1f}",
+        flush=True
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks for the LitSCOUT pipeline")
+    parser.add_argument("--stages", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="stages to run")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="article counts")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="timed runs per stage and size")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before timing")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="allowed relative growth of median latency and peak memory (default: 0.25)"
+    )
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument(
+        "--fetch-tokenizer", action="store_true",
+        help="download the tiktoken encoding into fixtures/tiktoken before blocking the network"
+    )
+    args = parser.parse_args(argv)
+
+    if args.fetch_tokenizer:
+        get_encoder()
+    _block_network()
+    tokenizer = tokenizer_mode()
+    if tokenizer == 'estimate':
+        print(
+            f"tiktoken encoding not found in {BENCHMARK_ENV['TIKTOKEN_CACHE_DIR']}; "
+            f"token counts are estimated from length (run once with --fetch-tokenizer)"
+        )
+    # Per-article INFO logging would dominate both the timings and the output
+    logging.disable(logging.INFO)
+    register_client("embeddings", FakeEmbeddings())
+    register_client("openai", FakeChatClient())
+
+    print(f"{'stage':18} {'size':>6} {'items':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/s':>11} {'peak MB':>9}")
+    results = {}
+    for stage in args.stages:
+        benchmark, min_samples = BENCHMARKS[stage]
+        for size in args.sizes:
+            result = measure(benchmark, size, args.repeats, args.warmup, min_samples)
+            results[result_key(stage, size)] = result
+            print_result(stage, size, result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({'tokenizer': tokenizer, 'results': results}, f, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, tokenizer)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    baseline_tokenizer, baseline = baseline
+    if baseline_tokenizer != tokenizer:
+        print(
+            f"Baseline {args.baseline} was measured with tokenizer mode '{baseline_tokenizer}' "
+            f"but this run used '{tokenizer}'; re-run with --save-baseline to compare"
+        )
+        return 1
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"No regressions against {args.baseline}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
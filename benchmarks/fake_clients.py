@@ -0,0 +1,62 @@
+# fake_clients.py
+
+import hashlib
+from types import SimpleNamespace
+import numpy as np
+
+# Dimensions of text-embedding-3-small, the model used by the app
+EMBEDDING_DIMENSIONS = 1536
+
+# Length of the canned summary returned by the fake chat client
+SUMMARY_WORDS = 400
+
+class FakeEmbeddings:
+    """
+    Offline stand-in for OpenAIEmbeddings. Each text maps to a fixed
+    pseudo-random unit vector, so repeated runs index identical data.
+    """
+
+    def __init__(self, dimensions=EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self._vector(text)
+
+class _FakeCompletions:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self._client.calls += 1
+        prompt_words = " ".join(message["content"] for message in messages).split()
+        words = [prompt_words[i % len(prompt_words)] for i in range(SUMMARY_WORDS)] if prompt_words else []
+        text = " ".join(words)
+        if not stream:
+            message = SimpleNamespace(role="assistant", content=text)
+            return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+        return (
+            SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=word + " "))])
+            for word in words
+        )
+
+class FakeChatClient:
+    """
+    Offline stand-in for the OpenAI client's chat.completions API, returning
+    a summary assembled from the prompt's own words, streamed word by word
+    when stream=True
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
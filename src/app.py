@@ -2,16 +2,322 @@
 
 import streamlit as st
 from datetime import datetime
-from chatgpt_functions import get_chatgpt_response
+from cachetools import TTLCache
+from chatgpt_functions import (
+    get_cache_stats,
+    get_embeddings,
+    get_openai_client,
+    get_text_splitter,
+    start_index_bootstrap,
+)
 from document_functions import create_word_doc_from_json
-from search_function import search_articles
+from citation_functions import CITATION_FORMATS
+from cache_functions import get_response_cache, get_search_cache
+from http_functions import get_session
+from job_functions import get_job_manager
+from trace_functions import TRACING_ENABLED, cache_prometheus_text, get_tracer
 import json
 import os
+import time
 import logging
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# In-memory reports shared across reruns and sessions
+APP_CACHE_MAX_ENTRIES = int(os.getenv("LITSCOUT_APP_CACHE_MAX_ENTRIES", "128"))
+REPORT_CACHE_TTL = float(os.getenv("LITSCOUT_REPORT_CACHE_TTL", str(6 * 3600)))
+
+# Seconds between job status polls, and between summary polls while the
+# summary is being written
+JOB_POLL_INTERVAL = 0.5
+SUMMARY_POLL_INTERVAL = 0.1
+
+STAGE_LABELS = {
+    'search': 'Searching databases',
+    'embed': 'Embedding articles',
+    'retrieve': 'Retrieving relevant context',
+    'summarize': 'Writing summary',
+    'document': 'Building the document',
+}
+
+@st.cache_resource(show_spinner=False)
+def load_shared_resources():
+    """
+    Create the HTTP session, API clients, text splitter and job manager once
+    per process and provision the vector index in the background, so reruns
+    and reports never pay for them
+    """
+    get_session()
+    get_text_splitter()
+    start_index_bootstrap()
+    # Resumes report jobs a previous process left unfinished
+    get_job_manager()
+    try:
+        get_openai_client()
+        get_embeddings()
+    except ValueError as e:
+        # Missing credentials surface again when a report is generated
+        logger.warning(f"API clients not created at startup: {e}")
+
+@st.cache_resource(show_spinner=False)
+def get_app_caches():
+    """
+    Size- and age-bounded report cache shared by all sessions
+    """
+    return {
+        'report': TTLCache(maxsize=APP_CACHE_MAX_ENTRIES, ttl=REPORT_CACHE_TTL),
+        'lock': threading.Lock(),
+    }
+
+def get_cached(name, key):
+    """
+    Value cached under key in the named app cache, or None
+    """
+    caches = get_app_caches()
+    with caches['lock']:
+        value = caches[name].get(key)
+    if value is not None:
+        logger.info(f"App {name} cache hit")
+    return value
+
+def store_cached(name, key, value):
+    caches = get_app_caches()
+    with caches['lock']:
+        caches[name][key] = value
+
+def make_report_key(request):
+    """
+    Report cache key. The citation format only affects the document, so it
+    is not part of the key.
+    """
+    return tuple(
+        tuple(value) if isinstance(value, list) else value
+        for field, value in sorted(request.items())
+        if field != 'citation_format'
+    )
+
+def is_complete_report(report):
+    # Reports missing a source that was down are not reused once it is back
+    if not report or report.get('source_errors'):
+        return False
+    return bool(report.get('response'))
+
+def clear_app_caches():
+    """
+    Drop cached search results (in memory and on disk), reports and
+    summaries
+    """
+    caches = get_app_caches()
+    with caches['lock']:
+        caches['report'].clear()
+    get_search_cache().clear()
+    get_response_cache().clear()
+    st.session_state.pop('report', None)
+
+def render_report(report, citation_format, show_summary=True):
+    """
+    Show the summary and offer the Word document in the selected citation
+    format. Only the document is rebuilt, so switching formats is instant.
+    """
+    report = dict(report, citation_format=citation_format)
+
+    # Display response
+    if show_summary:
+        st.subheader("Research Summary")
+        st.write(report['response'])
+
+    # Create Word doc in memory
+    doc_buffer = create_word_doc_from_json(report)
+    if not doc_buffer:
+        st.error("The Word document could not be created.")
+        return
+
+    # Provide download button
+    st.download_button(
+        label="Download Research Report",
+        data=doc_buffer.getvalue(),
+        file_name="research_report.docx",
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+
+    if TRACING_ENABLED and report.get('trace_id'):
+        show_debug_panel(report['trace_id'])
+
+def show_debug_panel(trace_id):
+    """
+    Per-stage timing breakdown of the report's trace and cache hit rates,
+    with the collected metrics and traces available for download
+    """
+    tracer = get_tracer()
+    cache_stats = get_cache_stats()
+    with st.expander("Debug: timing breakdown"):
+        rows = tracer.breakdown(trace_id)
+        if not rows:
+            st.caption("This report's trace is no longer kept in memory.")
+        else:
+            table = []
+            for row in rows:
+                # Indent nested spans under the stage that ran them
+                depth = row.pop('depth')
+                table.append(dict(row, span="\u2003" * depth + row['span'], seconds=round(row['seconds'], 3)))
+            st.dataframe(table, use_container_width=True, hide_index=True)
+        if cache_stats:
+            st.dataframe(
+                [
+                    dict(stats, cache=name, hit_ratio=f"{stats['hit_ratio']:.0%}")
+                    for name, stats in cache_stats.items()
+                ],
+                column_order=("cache", "hits", "stale_hits", "misses", "hit_ratio", "entries"),
+                use_container_width=True,
+                hide_index=True
+            )
+        metrics_col, trace_col = st.columns(2)
+        with metrics_col:
+            st.download_button(
+                label="Prometheus metrics",
+                data=tracer.prometheus_text() + cache_prometheus_text(cache_stats),
+                file_name="litscout_metrics.prom",
+                mime="text/plain"
+            )
+        with trace_col:
+            st.download_button(
+                label="Trace (OTLP JSON)",
+                data=json.dumps(tracer.otel_json([trace_id])),
+                file_name=f"litscout_trace_{trace_id}.json",
+                mime="application/json"
+            )
+
+def show_no_results_suggestions():
+    # Provide helpful suggestions
+    suggestions_col1, suggestions_col2 = st.columns(2)
+    
+    with suggestions_col1:
+        st.markdown("#### Modify Search")
+        st.write("- Broaden your keywords")
+        st.write("- Extend the date range")
+        st.write("- Remove specific filters")
+    
+    with suggestions_col2:
+        st.markdown("#### Alternative Actions")
+        st.write("- Try a different database")
+        st.write("- Rephrase your research topic")
+        st.write("- Check spelling")
+
+def show_source_errors(source_errors, failed):
+    """
+    Name the databases that could not be searched
+    """
+    lines = "\n".join(f"- {source}: {reason}" for source, reason in source_errors.items())
+    if failed:
+        st.error(f"Source unavailable. None of the selected databases could be searched:\n{lines}")
+        st.write("- Try again in a few minutes")
+        st.write("- Select a different database")
+    else:
+        st.warning(f"Source unavailable. This report leaves out:\n{lines}")
+
+def show_error_suggestions():
+    # Provide suggestions
+    suggestions_col1, suggestions_col2 = st.columns(2)
+    
+    with suggestions_col1:
+        st.markdown("#### Troubleshooting")
+        st.write("- Check your internet connection")
+        st.write("- Verify API keys are correctly set")
+    
+    with suggestions_col2:
+        st.markdown("#### Alternative Actions")
+        st.write("- Try a different research topic")
+        st.write("- Restart the application")
+
+def forget_job():
+    st.session_state.pop('job_id', None)
+    st.query_params.pop('job', None)
+
+def follow_summary(manager, job_id):
+    """
+    Yield a job's summary text as it is generated
+    """
+    sent = 0
+    while True:
+        status = manager.status(job_id)
+        text = status['partial_response']
+        if not text and status['stages']['summarize']['status'] == 'done':
+            text = manager.stage_output(job_id, 'summarize')['response']
+        if len(text) > sent:
+            yield text[sent:]
+            sent = len(text)
+        if status['stage'] != 'summarize' or status['status'] != 'running':
+            return
+        time.sleep(SUMMARY_POLL_INTERVAL)
+
+def follow_job(job_id, citation_format):
+    """
+    Show a report job's stage progress and stream its summary until it
+    finishes, then render the report or offer a retry
+    """
+    manager = get_job_manager()
+    status = manager.status(job_id)
+    if status is None:
+        forget_job()
+        st.warning("This report is no longer available. Please generate it again.")
+        return
+
+    progress = st.progress(status['progress'])
+    summary_shown = False
+    while status['status'] in ('queued', 'running'):
+        progress.progress(status['progress'], text=f"{STAGE_LABELS.get(status['stage'], 'Queued')}...")
+        if status['stage'] == 'summarize' and not summary_shown:
+            # Render tokens as they arrive; the document is built from the
+            # accumulated text afterwards
+            st.subheader("Research Summary")
+            st.write_stream(follow_summary(manager, job_id))
+            summary_shown = True
+        else:
+            time.sleep(JOB_POLL_INTERVAL)
+        status = manager.status(job_id)
+    progress.empty()
+
+    if status['status'] == 'failed':
+        failed_stage = status['stage']
+        logger.error(f"Report job {job_id} failed at {failed_stage}: {status['error']}")
+        source_errors = status['stages']['search'].get('source_errors')
+        if failed_stage == 'search' and source_errors:
+            show_source_errors(source_errors, failed=True)
+        elif failed_stage == 'search':
+            st.warning("Unable to generate research report. Please try again.")
+            show_no_results_suggestions()
+        else:
+            st.error(f"An error occurred while {STAGE_LABELS.get(failed_stage, 'generating the report').lower()}: {status['error']}")
+            show_error_suggestions()
+
+        # Finished stages are kept, so a retry resumes where the job failed
+        retry_col, modify_col = st.columns(2)
+        if retry_col.button("Try Again"):
+            manager.retry(job_id)
+            st.rerun()
+        if modify_col.button("Modify Search Parameters"):
+            forget_job()
+            st.rerun()
+        return
+
+    report = manager.result(job_id)
+    forget_job()
+    logger.info(f"Upstream calls for this report: {report['upstream_calls']}")
+    if is_complete_report(report):
+        store_cached('report', make_report_key(status['request']), report)
+
+    # Keep the report so later reruns (e.g. a new citation format) only
+    # rebuild the document
+    st.session_state['report'] = report
+    if report['source_errors']:
+        show_source_errors(report['source_errors'], failed=False)
+    render_report(report, citation_format, show_summary=not summary_shown)
+    st.success("Research report generated successfully!")
+
+load_shared_resources()
+
 # Get the absolute path to the assets directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 assets_dir = os.path.join(os.path.dirname(current_dir), 'assets')
@@ -40,6 +346,9 @@ st.header("Related Literature LLM Tool for Researchers")
 
 # Sidebar for configuration
 st.sidebar.header("Research Parameters")
+if st.sidebar.button("Clear Cached Results", help="Search the databases and regenerate summaries from scratch"):
+    clear_app_caches()
+    st.sidebar.success("Cached results cleared.")
 
 # Input fields
 research_topic = st.text_input("Research Topic:", help="Enter the main topic of your research")
@@ -71,7 +380,7 @@ with col2:
     )
     citation_format = st.selectbox(
         "Choose Citation Format:", 
-        ("APA", "MLA"),
+        CITATION_FORMATS,
         help="Select the citation style for references"
     )
 
@@ -91,10 +400,11 @@ else:
 with st.expander("Advanced Search Options"):
     col1, col2, col3 = st.columns(3)
     with col1:
-        open_access_site = st.selectbox(
-            "Open Access Publication Site:",
+        open_access_site = st.multiselect(
+            "Open Access Publication Sites:",
             ["ArXiv", "PubMed", "OpenAIRE"],
-            help="Select the citation style for references"
+            default=["ArXiv"],
+            help="Select one or more databases; several are searched concurrently"
         )
         # authors = st.text_area(
         #     "Author(s)",
@@ -114,6 +424,16 @@ with st.expander("Advanced Search Options"):
         # else:
         #     st.write("no input")
 
+    with col2:
+        max_results = st.number_input(
+            "Max Results per Site:",
+            min_value=10,
+            max_value=2000,
+            value=10,
+            step=10,
+            help="Number of articles to retrieve from each database"
+        )
+
     # with col2:
     #     citation_count = st.number_input(
     #         "Citation Count",
@@ -134,99 +454,53 @@ with st.expander("Advanced Search Options"):
 
 
 # test selection display
-st.write(f"Selected Open Access Pub. Site: {open_access_site}")
+st.write(f"Selected Open Access Pub. Sites: {', '.join(open_access_site) or 'None'}")
 
 # Generate button
-if st.button("Generate Research Report"):
-    if research_topic:
-        try:
-            with st.spinner('Generating research report...'):
-                # Search for articles
-                search_results = search_articles(research_topic, date_range, open_access_site)
-                logger.info(f"Search results count: {len(search_results)}")
-                logger.info(f"First few search results: {search_results[:2] if search_results else 'No results'}")
-                
-                # Generate response
-                response = get_chatgpt_response(
-                    research_topic, 
-                    related_topic, 
-                    field_of_study, 
-                    type_of_publication, 
-                    date_range, 
-                    keywords, 
-                    citation_format,
-                    open_access_site,
-                )
-                
-                # Check if response is empty or invalid
-                if not response or not response.get('response'):
-                    st.warning("Unable to generate research report. Please try again.")
-                    
-                    # Provide helpful suggestions
-                    suggestions_col1, suggestions_col2 = st.columns(2)
-                    
-                    with suggestions_col1:
-                        st.markdown("#### Modify Search")
-                        st.write("- Broaden your keywords")
-                        st.write("- Extend the date range")
-                        st.write("- Remove specific filters")
-                    
-                    with suggestions_col2:
-                        st.markdown("#### Alternative Actions")
-                        st.write("- Try a different database")
-                        st.write("- Rephrase your research topic")
-                        st.write("- Check spelling")
-                    
-                    # Option to modify search parameters
-                    if st.button("Modify Search Parameters"):
-                        st.experimental_rerun()
-                    
-                    st.stop()
-                
-                # Display response
-                st.subheader("Research Summary")
-                st.write(response['response'])
-                
-                # Create Word doc
-                doc_path = create_word_doc_from_json(response)
-                
-                # Provide download button
-                with open(doc_path, "rb") as file:
-                    st.download_button(
-                        label="Download Research Report",
-                        data=file,
-                        file_name="research_report.docx",
-                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    )
-                
-                st.success("Research report generated successfully!")
-        
-        except Exception as e:
-            # Catch any unexpected errors
-            st.error(f"An error occurred: {e}")
-            
-            # Provide suggestions
-            suggestions_col1, suggestions_col2 = st.columns(2)
-            
-            with suggestions_col1:
-                st.markdown("#### Troubleshooting")
-                st.write("- Check your internet connection")
-                st.write("- Verify API keys are correctly set")
-            
-            with suggestions_col2:
-                st.markdown("#### Alternative Actions")
-                st.write("- Try a different research topic")
-                st.write("- Restart the application")
-            
-            # Log the error for debugging
-            logger.error(f"Unexpected error in report generation: {e}")
-            
-            # Option to modify search parameters
-            if st.button("Try Again"):
-                st.experimental_rerun()
+generate_clicked = st.button("Generate Research Report")
+if generate_clicked:
+    if research_topic and not open_access_site:
+        st.warning("Please select at least one open access publication site.")
+    elif research_topic:
+        request = {
+            'research_topic': research_topic,
+            'related_topic': related_topic,
+            'field_of_study': field_of_study,
+            'type_of_publication': type_of_publication,
+            'date_range': list(date_range),
+            'keywords': keywords,
+            'citation_format': citation_format,
+            'open_access_site': list(open_access_site),
+            'max_results': int(max_results),
+            # The document is rendered in memory in the chosen citation format
+            'write_document': False,
+        }
+        report = get_cached('report', make_report_key(request))
+        if report is not None:
+            st.session_state['report'] = report
+            render_report(report, citation_format)
+            st.success("Research report generated successfully!")
+        else:
+            try:
+                # Generate in the background; the job outlives reruns and
+                # browser refreshes
+                job_id = get_job_manager().submit(request)
+                st.session_state['job_id'] = job_id
+                st.query_params['job'] = job_id
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+                show_error_suggestions()
+                logger.error(f"Unexpected error in report generation: {e}")
     else:
         st.warning("Please enter a research topic.")
 
+# Follow the active job, reattaching to it after a refresh
+active_job = st.session_state.get('job_id') or st.query_params.get('job')
+if active_job:
+    follow_job(active_job, citation_format)
+elif not generate_clicked and st.session_state.get('report'):
+    render_report(st.session_state['report'], citation_format)
+
 # Research parameters sidebar
 st.sidebar.markdown("---")
 st.sidebar.info("LitSCOUT helps researchers discover and summarize relevant academic literature.")
@@ -0,0 +1,138 @@
+# article_functions.py
+
+import re
+import ast
+import sys
+
+# Matches the identifier in ArXiv abstract URLs, without the version suffix
+ARXIV_ID_PATTERN = re.compile(r'arxiv\.org/abs/(\S+?)(?:v\d+)?$', re.IGNORECASE)
+
+class Article:
+    """
+    Normalized article record shared by every source.
+    Uses __slots__ and interned source/author strings so large result sets
+    stay compact, and gives downstream stages one schema to read.
+    """
+
+    __slots__ = (
+        'title', 'authors', 'abstract', 'published', 'url', 'source',
+        'doi', 'pmid', 'arxiv_id', 'journal', 'volume', 'issue', 'pages'
+    )
+
+    def __init__(
+        self,
+        title='',
+        authors=(),
+        abstract='',
+        published='',
+        url='',
+        source='',
+        doi='',
+        pmid='',
+        arxiv_id='',
+        journal='',
+        volume='',
+        issue='',
+        pages=''):
+        self.title = title or ''
+        self.authors = tuple(sys.intern(author) for author in authors if author)
+        self.abstract = abstract or ''
+        self.published = published or ''
+        self.url = url or ''
+        self.source = sys.intern(source or '')
+        self.doi = doi or ''
+        self.pmid = pmid or ''
+        self.arxiv_id = arxiv_id or ''
+        self.journal = journal or ''
+        self.volume = volume or ''
+        self.issue = issue or ''
+        self.pages = pages or ''
+
+    def __repr__(self):
+        return f"Article(title={self.title!r}, source={self.source!r}, published={self.published!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Article):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    @property
+    def year(self):
+        """
+        Four-digit publication year, or 'N/A' when unknown
+        """
+        year = self.published[:4]
+        return year if year.isdigit() else 'N/A'
+
+    @property
+    def authors_text(self):
+        return ', '.join(self.authors)
+
+    def to_dict(self):
+        """
+        JSON-serializable dict of all fields
+        """
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['authors'] = list(self.authors)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build an Article from to_dict() output or from the legacy per-source
+        dict schemas (ArXiv summary, PubMed metadata, OpenAIRE publication_date)
+        """
+        metadata = data.get('metadata') or {}
+        authors = data.get('authors') or []
+        if isinstance(authors, str):
+            authors = [author.strip() for author in authors.split(',')]
+        return cls(
+            title=data.get('title', ''),
+            authors=authors,
+            abstract=data.get('abstract') or data.get('summary', ''),
+            published=parse_date(data.get('published') or data.get('publication_date', '')),
+            url=data.get('url', ''),
+            source=data.get('source') or metadata.get('source', ''),
+            doi=data.get('doi', ''),
+            pmid=data.get('pmid') or metadata.get('pmid', ''),
+            arxiv_id=data.get('arxiv_id') or parse_arxiv_id(data.get('url', '')),
+            journal=data.get('journal', ''),
+            volume=data.get('volume', ''),
+            issue=data.get('issue', ''),
+            pages=data.get('pages', '')
+        )
+
+def parse_date(value):
+    """
+    Publication date as a string. Older saved results hold OpenAIRE dates as
+    dicts or their string form, e.g. "{'$': '2019-05-01'}"; these yield the '$' value.
+    """
+    if isinstance(value, str) and value.startswith('{'):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return ''
+    if isinstance(value, dict):
+        value = value.get('$', '')
+    return str(value) if value else ''
+
+def parse_arxiv_id(url):
+    """
+    Extract the ArXiv identifier from an abstract URL, or '' if there is none
+    """
+    match = ARXIV_ID_PATTERN.search(url or '')
+    return match.group(1) if match else ''
+
+def as_article(article):
+    """
+    Return article as an Article, converting legacy dicts
+    """
+    if isinstance(article, Article):
+        return article
+    return Article.from_dict(article)
+
+def articles_to_dicts(articles):
+    return [article.to_dict() for article in articles]
+
+def articles_from_dicts(data):
+    return [Article.from_dict(item) for item in data]
@@ -0,0 +1,493 @@
+# cache_functions.py
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: appends are only serialized within one process
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory for all on-disk caches
+CACHE_DIR = os.getenv(
+    "LITSCOUT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+)
+
+# Search results are fresh for a day and may be served stale for a week
+# while a background refresh runs
+SEARCH_CACHE_TTL = float(os.getenv("LITSCOUT_SEARCH_CACHE_TTL", str(24 * 3600)))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("LITSCOUT_SEARCH_CACHE_STALE_TTL", str(7 * 24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("LITSCOUT_SEARCH_CACHE_MAX_ENTRIES", "1000"))
+SEARCH_CACHE_ENABLED = os.getenv("LITSCOUT_SEARCH_CACHE", "1") != "0"
+
+EMBEDDING_CACHE_ENABLED = os.getenv("LITSCOUT_EMBEDDING_CACHE", "1") != "0"
+
+# Generated summaries are reused for queries whose embedding is at least this
+# similar to a cached query with the same retrieved context
+RESPONSE_CACHE_ENABLED = os.getenv("LITSCOUT_RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("LITSCOUT_RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL = float(os.getenv("LITSCOUT_RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("LITSCOUT_RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+class SQLiteCache:
+    """
+    JSON value cache stored in SQLite with TTL, LRU eviction and
+    stale-while-revalidate.
+
+    Entries younger than ttl are fresh. Entries younger than ttl + stale_ttl
+    are returned immediately while a background thread refreshes them.
+    Older entries are treated as misses. The least recently used entries are
+    evicted once more than max_entries are stored.
+    """
+
+    def __init__(self, path, ttl, stale_ttl=0, max_entries=1000):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Return (value, is_fresh) for key, or (None, False) on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, False
+            value, created = row
+            age = now - created
+            if age > self.ttl + self.stale_ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None, False
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value), age <= self.ttl
+
+    def set(self, key, value):
+        """
+        Store a JSON-serializable value and evict past the size cap
+        """
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute(
+            "DELETE FROM cache WHERE created < ?",
+            (time.time() - self.ttl - self.stale_ttl,)
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def get_or_refresh(self, key, fetch, should_store=bool):
+        """
+        Return the cached value for key, or None on a miss.
+        A stale value is returned as-is and refreshed in the background with
+        fetch(); the caller fills misses itself.
+        """
+        value, fresh = self.get(key)
+        if value is None:
+            self.misses += 1
+        elif fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            self._refresh_in_background(key, fetch, should_store)
+        return value
+
+    def get_or_fetch(self, key, fetch, should_store=bool):
+        """
+        Return the cached value for key, calling fetch() on a miss.
+        A stale value is returned as-is and refreshed in the background.
+        Values for which should_store(value) is false are not cached.
+        """
+        value = self.get_or_refresh(key, fetch, should_store)
+        if value is not None:
+            return value
+
+        value = fetch()
+        if should_store(value):
+            self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key, fetch, should_store):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = fetch()
+                if should_store(value):
+                    self.set(key, value)
+            except Exception as e:
+                logger.warning(f"Background cache refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Hit, stale hit and miss counts plus current size
+        """
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            'entries': size
+        }
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+def get_search_cache():
+    """
+    Return the process-wide search result cache
+    """
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SQLiteCache(
+                    os.path.join(CACHE_DIR, "search_results.sqlite3"),
+                    ttl=SEARCH_CACHE_TTL,
+                    stale_ttl=SEARCH_CACHE_STALE_TTL,
+                    max_entries=SEARCH_CACHE_MAX_ENTRIES
+                )
+    return _search_cache
+
+def make_search_key(query, date_range, source, max_results=None):
+    """
+    Cache key from the normalized query, (start_year, end_year), source and
+    requested result count
+    """
+    normalized_query = " ".join(query.lower().split())
+    start_year, end_year = date_range
+    key = f"{source.lower()}|{int(start_year)}|{int(end_year)}|{normalized_query}"
+    if max_results is not None:
+        key += f"|{int(max_results)}"
+    return key
+
+def get_search_cache_stats():
+    """
+    Hit/miss counts of the search cache, or None when it is disabled
+    """
+    return get_search_cache().stats() if SEARCH_CACHE_ENABLED else None
+
+def embedding_key(model, text):
+    """
+    Content hash identifying one (model, chunk text) embedding
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding store: an append-only float32 matrix file plus a
+    SQLite index mapping content hashes to row numbers.
+    The matrix is read through a memory map, so lookups touch only the rows
+    they need.
+    """
+
+    def __init__(self, directory):
+        import numpy as np
+        self._np = np
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._matrix = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.lock_path = os.path.join(directory, "vectors.lock")
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+        self.dimension = int(row[0]) if row else None
+
+    def _rows(self):
+        if not self.dimension or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dimension * 4)
+
+    def _load_matrix(self, min_rows):
+        if self.dimension is None:
+            # Another process stored the first vectors
+            (value,) = self._conn.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+            self.dimension = int(value)
+        # Remap only when rows were appended since the last mapping
+        if self._matrix is None or len(self._matrix) < min_rows:
+            self._matrix = self._np.memmap(
+                self.vectors_path, dtype=self._np.float32, mode="r",
+                shape=(self._rows(), self.dimension)
+            )
+        return self._matrix
+
+    def get_many(self, keys):
+        """
+        Return {key: vector} for the keys present in the cache
+        """
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if found:
+                matrix = self._load_matrix(max(found.values()) + 1)
+                found = {key: self._np.array(matrix[row]) for key, row in found.items()}
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, keys, vectors):
+        """
+        Append vectors for keys that are not stored yet
+        """
+        vectors = self._np.asarray(vectors, dtype=self._np.float32)
+        if not len(keys):
+            return
+        # The cache directory is shared by the app and the CLI, so appends
+        # are serialized across processes: row numbers come from the file
+        # size, which must not change between reading it and writing rows
+        with self._lock, self._file_lock():
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+            if row is not None:
+                self.dimension = int(row[0])
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('dimension', ?)",
+                    (str(self.dimension),)
+                )
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {vectors.shape[1]}")
+
+            new_rows = []
+            seen = set()
+            for i, key in enumerate(keys):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if self._conn.execute("SELECT 1 FROM vectors WHERE key = ?", (key,)).fetchone() is None:
+                    new_rows.append(i)
+            if not new_rows:
+                self._conn.commit()
+                return
+
+            first_row = self._rows()
+            row_bytes = self.dimension * 4
+            if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != first_row * row_bytes:
+                # A crash mid-append left a partial row; appending after it
+                # would misalign every later row
+                logger.warning(f"Truncating partial row at the end of {self.vectors_path}")
+                os.truncate(self.vectors_path, first_row * row_bytes)
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors[new_rows].tobytes())
+            self._conn.executemany(
+                "INSERT INTO vectors (key, row) VALUES (?, ?)",
+                [(keys[i], first_row + offset) for offset, i in enumerate(new_rows)]
+            )
+            self._conn.commit()
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Exclusive lock on the cache directory shared with other processes
+        """
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': self._rows()
+        }
+
+_embedding_caches = {}
+_embedding_caches_lock = threading.Lock()
+
+def get_embedding_cache(model):
+    """
+    Return the process-wide embedding cache for a model
+    """
+    with _embedding_caches_lock:
+        if model not in _embedding_caches:
+            _embedding_caches[model] = EmbeddingCache(os.path.join(CACHE_DIR, "embeddings", model))
+        return _embedding_caches[model]
+
+def context_fingerprint(model, context):
+    """
+    Hash of the model and retrieved context a summary was generated from
+    """
+    return hashlib.sha256(f"{model}\0{context}".encode("utf-8")).hexdigest()
+
+class SemanticResponseCache:
+    """
+    In-memory LRU/TTL cache of generated summaries.
+    Entries are grouped by context fingerprint; a lookup returns the summary
+    of the most similar cached query with the same fingerprint when its
+    cosine similarity reaches threshold.
+    """
+
+    def __init__(self, threshold, ttl, max_entries):
+        import numpy as np
+        self._np = np
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._next_id = 0
+        self._entries = OrderedDict()
+        self._by_fingerprint = {}
+        self._lock = threading.Lock()
+
+    def _unit(self, vector):
+        vector = self._np.asarray(vector, dtype=self._np.float32)
+        norm = self._np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id):
+        fingerprint = self._entries.pop(entry_id)[0]
+        ids = self._by_fingerprint[fingerprint]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_fingerprint[fingerprint]
+
+    def get(self, vector, fingerprint):
+        """
+        Return the cached summary for a similar query and identical context,
+        or None
+        """
+        query = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_fingerprint.get(fingerprint, ())):
+                _, cached_vector, _, created = self._entries[entry_id]
+                if now - created > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = float(cached_vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            logger.info(f"Response cache hit (similarity {best_score:.3f})")
+            return self._entries[best_id][2]
+
+    def set(self, vector, fingerprint, response):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (fingerprint, self._unit(vector), response, time.time())
+            self._by_fingerprint.setdefault(fingerprint, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_fingerprint.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries)
+        }
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """
+    Return the process-wide semantic response cache
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = SemanticResponseCache(
+                RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES
+            )
+        return _response_cache
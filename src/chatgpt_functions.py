@@ -1,17 +1,38 @@
 # chatgpt_functions.py
 
 import os
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import OpenAI
-import pinecone
-from pinecone import Pinecone, ServerlessSpec
 import logging
-#langchain imports
-from langchain.docstore.document import Document
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_pinecone import Pinecone as LangchainPinecone
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from search_function import search_arxiv_articles, search_articles
+# openai, pinecone and langchain are imported on first use to keep startup fast
+from article_functions import as_article
+from dedupe_functions import dedupe_articles
+from cache_functions import (
+    EMBEDDING_CACHE_ENABLED,
+    RESPONSE_CACHE_ENABLED,
+    context_fingerprint,
+    embedding_key,
+    get_response_cache,
+    get_search_cache_stats,
+)
+from context_functions import CONTEXT_CANDIDATES, CONTEXT_TOKEN_BUDGET, count_tokens, pack_context, scored_candidates
+from vector_store_functions import (
+    VECTOR_STORE_BACKEND,
+    collect_stale_namespaces,
+    create_chroma_store,
+    delete_chroma_collection,
+    get_namespace_registry,
+    make_namespace,
+    open_local_vector_store,
+    resolve_backend,
+    unique_documents,
+)
+from search_function import search_articles, track_upstream_calls
+from trace_functions import span, start_span
 
 # Set up logging configuration
 logging.basicConfig(
@@ -25,249 +46,724 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Check for required environment variables
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-# pinecone_api_key = pinecone.Pinecone(api_key= os.getenv("PINECONE_API_KEY"))
-openai_api_key = os.getenv("OPENAI_API_KEY")
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+def _require_env(name):
+    """
+    Return a required environment variable, failing with a deployment hint
+    """
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(
+            f"{name} environment variable is not set. "
+            "Please set it in your Streamlit deployment settings."
+        )
+    return value
 
-if not pinecone_api_key:
-    raise ValueError(
-        "PINECONE_API_KEY environment variable is not set. "
-        "Please set it in your Streamlit deployment settings."
+# API clients are created on first use, so importing this module stays cheap
+# and does not need credentials
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_client(name, factory):
+    """
+    Return the process-wide client registered under name, creating it with
+    factory() on first use
+    """
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+def register_client(name, client):
+    """
+    Use client for name instead of creating one, e.g. offline stand-ins
+    for "openai" or "embeddings" in benchmarks
+    """
+    with _clients_lock:
+        _clients[name] = client
+
+def _create_pinecone_client():
+    from pinecone import Pinecone
+    return Pinecone(api_key=_require_env("PINECONE_API_KEY"))
+
+def _create_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=_require_env("OPENAI_API_KEY"))
+
+def _create_embeddings():
+    from langchain_community.embeddings import OpenAIEmbeddings
+    embeddings = OpenAIEmbeddings(
+        api_key=_require_env("OPENAI_API_KEY"),
+        model=EMBEDDING_MODEL
     )
+    # Only chunks that were never embedded before are sent to the embedding API
+    if EMBEDDING_CACHE_ENABLED:
+        from embedding_functions import CachedEmbeddings
+        embeddings = CachedEmbeddings(embeddings, EMBEDDING_MODEL)
+    return embeddings
 
-if not openai_api_key:
-    raise ValueError(
-        "OPENAI_API_KEY environment variable is not set. "
-        "Please set it in your Streamlit deployment settings."
+def _create_text_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=100,
+        length_function=len
     )
 
-# Initialize Pinecone with explicit API key
-pc = pinecone.Pinecone(
-    api_key=pinecone_api_key  # Use the explicitly loaded API key
-)
+def get_pinecone_client():
+    return _get_client("pinecone", _create_pinecone_client)
 
-# Initialize OpenAI clients with explicit API keys
-client = OpenAI(api_key=openai_api_key)
-embeddings = OpenAIEmbeddings(
-    api_key=openai_api_key,
-    model="text-embedding-3-small"
-)
+def get_openai_client():
+    return _get_client("openai", _create_openai_client)
+
+def get_embeddings():
+    return _get_client("embeddings", _create_embeddings)
+
+def get_text_splitter():
+    return _get_client("text_splitter", _create_text_splitter)
+
+def get_embedding_cache_stats():
+    """
+    Hit/miss counts of the embedding cache, or None when it is disabled or
+    a registered client bypasses it
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    stats = getattr(get_embeddings(), 'stats', None)
+    return stats() if stats is not None else None
 
 def prepare_documents_for_embedding(articles):
     """
     Prepare articles for embedding by splitting long texts
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100,
-        length_function=len
-    )
+    from langchain.docstore.document import Document
+    text_splitter = get_text_splitter()
+    chunk_span = start_span("chunk")
     
     docs = []
     for article in articles:
         try:
-            # Get the text content (either summary or abstract)
-            text_content = article.get('summary', article.get('abstract', ''))
-            
-            # Convert authors list to string if necessary
-            authors = article.get('authors', [])
-            if isinstance(authors, list):
-                authors = ', '.join(authors)
-            
+            article = as_article(article)
+
             # Title and content
-            full_text = f"Title: {article['title']} Content: {text_content}"
+            full_text = f"Title: {article.title} Content: {article.abstract}"
             splits = text_splitter.split_text(full_text)
             
-            # Get metadata with fallbacks for optional fields
             metadata = {
-                'title': article['title'],
-                'url': article.get('url', ''),
-                'authors': authors,
-                'source': article.get('metadata', {}).get('source', '')
+                'title': article.title,
+                'url': article.url,
+                'authors': article.authors_text,
+                'source': article.source,
+                'pmid': article.pmid,
+                'doi': article.doi
             }
             
-            # Add optional PMID if available
-            if 'pmid' in article.get('metadata', {}):
-                metadata['pmid'] = article['metadata']['pmid']
-            
-            for split in splits:
+            # The chunk index lets retrieval reassemble neighbouring chunks in order
+            for i, split in enumerate(splits):
                 docs.append(Document(
                     page_content=split,
-                    metadata=metadata
+                    metadata=dict(metadata, chunk=i)
                 ))
         except Exception as e:
             logger.error(f"Error processing article for embedding: {e}")
             continue
     
     logger.info(f"Prepared {len(docs)} documents for embedding")
+    chunk_span.add("items", len(docs))
+    chunk_span.end()
     return docs
 
-def create_vector_store(articles):
+PINECONE_INDEX_NAME = "litscout-articles"
+
+# Vectors per Pinecone upsert request, keeping requests under the 2 MB limit
+PINECONE_UPSERT_BATCH = 100
+
+# Maximum time to wait for a newly created index to report ready
+INDEX_READY_TIMEOUT = float(os.getenv("LITSCOUT_INDEX_READY_TIMEOUT", "120"))
+INDEX_POLL_INTERVAL = 1.0
+
+_pinecone_index = None
+_pinecone_index_error = None
+_pinecone_index_ready = threading.Event()
+_index_bootstrap_thread = None
+_index_bootstrap_lock = threading.Lock()
+
+def ensure_pinecone_index(timeout=INDEX_READY_TIMEOUT):
     """
-    Create a vector store from articles using Pinecone and OpenAI embeddings
+    Create the Pinecone index if it is missing and poll describe_index until
+    it is ready. Returns the data-plane Index handle.
     """
-    # Log the input articles for debugging
-    logger.info(f"Creating vector store. Input articles type: {type(articles)}")
-    logger.info(f"Number of input articles: {len(articles) if hasattr(articles, '__len__') else 'Unknown'}")
-    
-    # Validate input
-    if not articles:
-        logger.warning("No articles provided for vector store creation")
-        return None
-    
+    from pinecone import ServerlessSpec
+    pc = get_pinecone_client()
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        logger.info(f"Creating new index: {PINECONE_INDEX_NAME}")
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=1536,  # OpenAI embeddings dimension
+            metric='cosine',
+            spec=ServerlessSpec(
+                cloud='aws',
+                region='us-east-1'
+            )
+        )
+
+    deadline = time.monotonic() + timeout
+    while not pc.describe_index(PINECONE_INDEX_NAME).status['ready']:
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Index {PINECONE_INDEX_NAME} not ready after {timeout}s")
+        time.sleep(INDEX_POLL_INTERVAL)
+
+    logger.info(f"Index {PINECONE_INDEX_NAME} is ready")
+    return pc.Index(PINECONE_INDEX_NAME)
+
+def _bootstrap_index():
+    global _pinecone_index, _pinecone_index_error
     try:
-        # Ensure articles is a list
-        if not isinstance(articles, list):
-            articles = list(articles)
-        
-        # Prepare documents
-        docs = prepare_documents_for_embedding(articles)
-        
-        if not docs:
-            logger.warning("No documents were prepared for embedding")
-            return None
+        _pinecone_index = ensure_pinecone_index()
+    except Exception as e:
+        logger.error(f"Pinecone index bootstrap failed: {e}")
+        _pinecone_index_error = e
+    finally:
+        _pinecone_index_ready.set()
 
-        # Create or get existing index
-        index_name = "litscout-articles"
-        
-        try:
-            # Check if index exists
-            existing_indexes = pc.list_indexes().names()
-            
-            # Create index if it doesn't exist
-            if index_name not in existing_indexes:
-                logger.info(f"Creating new index: {index_name}")
-                pc.create_index(
-                    name=index_name,
-                    dimension=1536,  # OpenAI embeddings dimension
-                    metric='cosine',
-                    spec=ServerlessSpec(
-                        cloud='aws',
-                        region='us-east-1'
-                    )
-                )
-                # Wait for index to be ready
-                import time
-                time.sleep(10)  # Give some time for index to initialize
-            
-            logger.info(f"Using index: {index_name}")
-            
-            # Initialize Pinecone vector store with LangChain
-            vector_store = LangchainPinecone.from_documents(
-                docs,
-                embeddings,
-                index_name=index_name
+def start_index_bootstrap(force=False):
+    """
+    Provision the Pinecone index in a background thread, once per process.
+    Call at startup so the first report does not pay for index creation.
+    Does nothing for other vector store backends unless force is set.
+    """
+    global _index_bootstrap_thread, _pinecone_index_error
+    if VECTOR_STORE_BACKEND != "pinecone" and not force:
+        return
+    with _index_bootstrap_lock:
+        # Retry on the next call if the previous attempt failed
+        if _pinecone_index_error is not None:
+            _pinecone_index_error = None
+            _pinecone_index_ready.clear()
+            _index_bootstrap_thread = None
+        if _index_bootstrap_thread is None:
+            _index_bootstrap_thread = threading.Thread(
+                target=_bootstrap_index, name="litscout-index-bootstrap", daemon=True
             )
-            
-            logger.info(f"Successfully created vector store with {len(docs)} documents")
-            return vector_store
-            
+            _index_bootstrap_thread.start()
+
+def get_pinecone_index(timeout=INDEX_READY_TIMEOUT):
+    """
+    Process-wide Pinecone Index handle, waiting up to timeout for bootstrap
+    """
+    if _pinecone_index is None:
+        # No-op while a bootstrap is in flight; restarts one that failed
+        start_index_bootstrap(force=True)
+        if not _pinecone_index_ready.wait(timeout):
+            raise TimeoutError(f"Index {PINECONE_INDEX_NAME} not ready after {timeout}s")
+        if _pinecone_index_error is not None:
+            raise _pinecone_index_error
+    return _pinecone_index
+
+def delete_namespace(namespace, backend):
+    """
+    Remove all vectors stored under a report namespace
+    """
+    if backend == "pinecone":
+        get_pinecone_index().delete(delete_all=True, namespace=namespace)
+    elif backend == "chroma":
+        delete_chroma_collection(namespace)
+
+def _register_namespace(namespace, backend):
+    """
+    Mark a namespace as used and occasionally sweep stale ones in the background
+    """
+    registry = get_namespace_registry()
+    registry.touch(namespace, backend)
+    if registry.gc_due():
+        threading.Thread(
+            target=collect_stale_namespaces, args=(delete_namespace,), daemon=True
+        ).start()
+
+def upsert_pinecone_vectors(index, namespace, vectors, documents, ids):
+    """
+    Upsert pre-computed vectors with their metadata, PINECONE_UPSERT_BATCH at
+    a time. The chunk text is stored under 'text', where LangChain reads it.
+    """
+    records = [
+        {
+            'id': doc_id,
+            'values': [float(x) for x in vector],
+            'metadata': dict(doc.metadata, text=doc.page_content)
+        }
+        for vector, doc, doc_id in zip(vectors, documents, ids)
+    ]
+    for start in range(0, len(records), PINECONE_UPSERT_BATCH):
+        index.upsert(vectors=records[start:start + PINECONE_UPSERT_BATCH], namespace=namespace)
+
+def _open_store(backend, namespace):
+    """
+    Vector store for a namespace plus a write(vectors, documents, ids)
+    function storing pre-computed vectors in it
+    """
+    if namespace and backend != "numpy":
+        _register_namespace(namespace, backend)
+
+    embeddings = get_embeddings()
+    if backend == "pinecone":
+        try:
+            # Data-plane only: the index handle is provisioned once per process
+            index = get_pinecone_index()
+            logger.info(f"Using index: {PINECONE_INDEX_NAME}")
         except Exception as e:
             logger.error(f"Pinecone index error: {str(e)}")
             raise
-    
-    except Exception as e:
-        logger.error(f"Vector store creation error: {str(e)}")
-        # Log the first few articles for debugging
+
+        # Initialize Pinecone vector store with LangChain
+        from langchain_pinecone import Pinecone as LangchainPinecone
+        vector_store = LangchainPinecone(
+            index=index,
+            embedding=embeddings,
+            namespace=namespace
+        )
+
+        def write(vectors, documents, batch_ids):
+            upsert_pinecone_vectors(index, namespace, vectors, documents, batch_ids)
+        return vector_store, write
+    return open_local_vector_store(embeddings, backend, collection_name=namespace or PINECONE_INDEX_NAME)
+
+def _embed_documents(write, backend, docs, ids):
+    """
+    Embed chunks in batches, storing each batch as soon as it is embedded,
+    while later batches are in flight
+    """
+    def store_batch(indices, vectors):
+        with span("upsert", backend=backend) as upsert_span:
+            write(vectors, [docs[i] for i in indices], [ids[i] for i in indices])
+            upsert_span.add("items", len(indices))
+
+    from embedding_functions import embed_in_batches
+    with span("embed", backend=backend, model=EMBEDDING_MODEL):
+        embed_in_batches(get_embeddings(), [doc.page_content for doc in docs], store_batch)
+
+def index_documents(docs, ids, backend=None, namespace=None):
+    """
+    Embed prepared chunks and store them under ids in namespace.
+    Returns a vector store supporting similarity_search; errors propagate.
+    """
+    backend = resolve_backend(backend, len(docs))
+    vector_store, write = _open_store(backend, namespace)
+    _embed_documents(write, backend, docs, ids)
+    logger.info(f"Successfully created {backend} vector store with {len(docs)} documents")
+    return vector_store
+
+class IncrementalIndex:
+    """
+    Embeds articles in the background as search pages arrive, so embedding
+    starts before the last page lands.
+
+    add() chunks a page and queues its new chunks; a single worker thread
+    opens the store and embeds queued chunks in order. finish() makes sure
+    exactly the final article set is embedded and returns the store.
+    Chunks of records later merged into another are left in the store;
+    they belong to the same paper.
+    """
+
+    def __init__(self, backend=None, namespace=None):
+        # "local" starts on numpy and is rebuilt in finish() if it outgrows it
+        self.requested_backend = backend
+        self.backend = resolve_backend(backend, 0)
+        self.namespace = namespace
+        self._ids = set()
+        self._store = None
+        self._write = None
+        self._pending = []
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="litscout-index")
+
+    def _run(self, docs, ids):
+        if self._store is None:
+            self._store, self._write = _open_store(self.backend, self.namespace)
+        _embed_documents(self._write, self.backend, docs, ids)
+
+    def _submit(self, docs):
+        docs, ids = unique_documents(docs)
+        new = [(doc, doc_id) for doc, doc_id in zip(docs, ids) if doc_id not in self._ids]
+        if not new:
+            return
+        self._ids.update(doc_id for _, doc_id in new)
+        # Copy the context so the embedding spans join the caller's trace
+        context = contextvars.copy_context()
+        self._pending.append(self._pool.submit(
+            context.run, self._run, [doc for doc, _ in new], [doc_id for _, doc_id in new]
+        ))
+
+    def add(self, articles):
+        """
+        Queue the chunks of newly found articles for embedding
+        """
         if articles:
-            logger.error(f"First article details: {articles[0]}")
-        return None
+            self._submit(prepare_documents_for_embedding(articles))
+
+    def finish(self, articles):
+        """
+        Embed whatever the final, deduplicated articles still lack and wait
+        for all queued work. Returns (vector_store, backend, chunk ids).
+        """
+        docs, ids = unique_documents(prepare_documents_for_embedding(articles))
+        if not docs:
+            self.close()
+            raise ValueError("No documents were prepared for embedding")
+        try:
+            if resolve_backend(self.requested_backend, len(docs)) != self.backend:
+                # Too many chunks for numpy; the embedding cache makes the rebuild cheap
+                self._wait()
+                self.backend = resolve_backend(self.requested_backend, len(docs))
+                return index_documents(docs, ids, self.backend, self.namespace), self.backend, ids
+            self._submit(docs)
+            self._wait()
+            if self._store is None:
+                self._store, self._write = _open_store(self.backend, self.namespace)
+            logger.info(f"Successfully created {self.backend} vector store with {len(docs)} documents")
+            return self._store, self.backend, ids
+        finally:
+            self.close()
+
+    def _wait(self):
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def open_vector_store(backend, namespace):
+    """
+    Reopen the persisted store holding a namespace's chunks without
+    re-embedding them, or None for the in-process numpy backend
+    """
+    if backend == "pinecone":
+        from langchain_pinecone import Pinecone as LangchainPinecone
+        return LangchainPinecone(index=get_pinecone_index(), embedding=get_embeddings(), namespace=namespace)
+    if backend == "chroma":
+        return create_chroma_store([], get_embeddings(), namespace or PINECONE_INDEX_NAME)
+    return None
 
-def retrieve_relevant_context(vector_store, query, top_k=3):
+def retrieve_relevant_context(vector_store, query, top_k=CONTEXT_CANDIDATES, token_budget=CONTEXT_TOKEN_BUDGET):
     """
-    Retrieve most relevant context from vector store
+    Retrieve most relevant context from vector store.
+    The top_k best chunks are packed into at most token_budget tokens,
+    grouped per article with overlapping text removed.
     """
     # Check if vector store is None or invalid
     if vector_store is None:
         logger.warning("No vector store provided for context retrieval")
         return ""
     
+    retrieve_span = start_span("retrieve", top_k=top_k, token_budget=token_budget)
     try:
-        # Retrieve relevant documents
-        relevant_docs = vector_store.similarity_search(query, k=top_k)
+        # Retrieve relevant documents with their scores
+        scored_docs = scored_candidates(vector_store, query, top_k)
         
         # If no relevant documents found
-        if not relevant_docs:
+        if not scored_docs:
             logger.info("No relevant context found")
             return ""
         
-        # Extract and format context
-        context = "\n\n".join([
-            f"Document {i+1}: {doc.page_content}" 
-            for i, doc in enumerate(relevant_docs)
-        ])
+        # Pack the best chunks into the token budget
+        context, stats = pack_context(scored_docs, token_budget)
         
-        logger.info(f"Retrieved {len(relevant_docs)} relevant context documents")
+        logger.info(
+            f"Packed {stats['chunks']} of {len(scored_docs)} retrieved chunks from "
+            f"{stats['articles']} articles into {stats['tokens']}/{stats['budget']} tokens"
+        )
+        retrieve_span.add("items", stats['chunks'])
+        retrieve_span.add("tokens_out", stats['tokens'])
         return context
     
     except Exception as e:
+        retrieve_span.end(e)
         logger.error(f"Error retrieving context: {str(e)}")
         return ""
+    finally:
+        retrieve_span.end()
 
-def get_chatgpt_response(
-    research_topic, 
-    related_topic, 
-    field_of_study, 
-    type_of_publication, 
-    date_range, 
-    keywords, 
-    citation_format, 
-    open_access_site):
-    """
-    Enhanced response generation with RAG
-    """
-    # Construct query
+# Placeholder choices of the app's select boxes, meaning no filter
+UNSPECIFIED_OPTIONS = ("", "-- Not Specified --", "-- Select --")
+
+def build_search_query(
+    research_topic,
+    related_topic,
+    field_of_study,
+    type_of_publication,
+    keywords):
+    """
+    Construct the search query used for both source search and retrieval
+    """
     query = research_topic
     if related_topic:
         query += f" related to {related_topic}"
-    if field_of_study != "-- Select --":
+    if field_of_study not in UNSPECIFIED_OPTIONS:
         query += f" in {field_of_study}"
-    if type_of_publication != "-- Select --":
+    if type_of_publication not in UNSPECIFIED_OPTIONS:
         query += f" {type_of_publication}"
     if keywords:
         query += f" keywords: {keywords}"
+    return query
 
-    # Search for articles via 1 openSourceDB for articles for the mean time. Add more when data source input field is specified in app.py
-    # search_results = search_arxiv_articles(query, date_range)
-    search_results = search_articles(query, date_range, open_access_site)
+SUMMARY_MODEL = "gpt-3.5-turbo"
 
-    # word -> vec (Create vector store)
-    vector_store = create_vector_store(search_results)
+def build_summary_messages(query, context):
+    """
+    Chat messages asking for a research summary grounded in the retrieved context
+    """
+    # Semantic decomposition by providing the AI assistant about the intent of the query
+    return [
+        {
+            "role": "system", 
+            "content": "You are a research assistant that provides comprehensive and academic summaries. Use the provided context retrieved from the embeddings to enhance your response."
+        },
+        {
+            "role": "user", 
+            "content": f"Provide a comprehensive research summary on: {query}. "
+                       f"Use these contextually relevant document excerpts: {context}"
+        }
+    ]
 
-    if vector_store is None:
-        logger.warning("No vector store provided for context retrieval")
-        return ""
-    # Retrieve relevant context
-    context = retrieve_relevant_context(vector_store, query)
+def cached_query_vector(query):
+    """
+    The query's embedding from the embedding cache, where retrieval stored it,
+    or None when it is not cached
+    """
+    embeddings = get_embeddings()
+    cache = getattr(embeddings, 'cache', None)
+    if cache is None:
+        return None
+    key = embedding_key(embeddings.model, query)
+    return cache.get_many([key]).get(key)
 
+def summary_cache_key(query, context):
+    """
+    (query embedding, context fingerprint) identifying a summary in the
+    response cache, or None when the cache is disabled or the query has no
+    cached embedding. The query is not embedded again just to build the key.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    try:
+        vector = cached_query_vector(query)
+    except Exception as e:
+        logger.warning(f"Response cache skipped, query embedding could not be read: {e}")
+        return None
+    if vector is None:
+        logger.debug("Response cache skipped, the query embedding is not cached")
+        return None
+    return vector, context_fingerprint(SUMMARY_MODEL, context)
+
+def cached_summary(cache_key):
+    return None if cache_key is None else get_response_cache().get(*cache_key)
 
-    # Use OpenAI to generate response with retrieved context (Semantic decomposition by providing the AI assistant about the intent of the qquery)
+def store_summary(cache_key, response):
+    if cache_key is not None:
+        get_response_cache().set(*cache_key, response)
+
+def get_response_cache_stats():
+    """
+    Hit/miss counts of the semantic response cache, or None when it is disabled
+    """
+    return get_response_cache().stats() if RESPONSE_CACHE_ENABLED else None
+
+def get_cache_stats():
+    """
+    Stats of the search, embedding and response caches by name, leaving out disabled caches
+    """
+    stats = {
+        'search': get_search_cache_stats(),
+        'embedding': get_embedding_cache_stats(),
+        'response': get_response_cache_stats(),
+    }
+    return {name: value for name, value in stats.items() if value is not None}
+
+def _record_llm_tokens(llm_span, messages, response, usage=None):
+    """
+    Add prompt and completion token counts to an llm span, taken from the
+    API's usage report when there is one and counted locally otherwise
+    """
+    if not llm_span.recording:
+        return
+    if usage is not None:
+        llm_span.add("tokens_in", usage.prompt_tokens)
+        llm_span.add("tokens_out", usage.completion_tokens)
+    else:
+        llm_span.add("tokens_in", sum(count_tokens(message['content']) for message in messages))
+        llm_span.add("tokens_out", count_tokens(response))
+
+def generate_summary(messages, cache_key=None):
+    """
+    Summary text for the messages, reusing the summary of a near-identical
+    query over the same context. API errors propagate.
+    """
+    with span("llm", model=SUMMARY_MODEL) as llm_span:
+        cached = cached_summary(cache_key)
+        if cached is not None:
+            llm_span.add("cache_hits")
+            return cached
+        if cache_key is not None:
+            llm_span.add("cache_misses")
+        chat_response = get_openai_client().chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=messages
+        )
+        response = chat_response.choices[0].message.content
+        _record_llm_tokens(llm_span, messages, response, getattr(chat_response, 'usage', None))
+        store_summary(cache_key, response)
+        return response
+
+def iter_summary(messages, cache_key=None):
+    """
+    Yield summary text as the model produces it, or all at once when it is
+    in the response cache. API errors propagate.
+    """
+    # Not made the current span, since the caller's code runs between yields
+    llm_span = start_span("llm", model=SUMMARY_MODEL, stream=True)
     try:
-        chat_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a research assistant that provides comprehensive and academic summaries. Use the provided context retrieved from the embeddings to enhance your response."
-                },
-                {
-                    "role": "user", 
-                    "content": f"Provide a comprehensive research summary on: {query}. "
-                               f"Use these contextually relevant document excerpts: {context}"
-                }
-            ]
+        cached = cached_summary(cache_key)
+        if cached is not None:
+            llm_span.add("cache_hits")
+            yield cached
+            return
+        if cache_key is not None:
+            llm_span.add("cache_misses")
+
+        parts = []
+        started = time.perf_counter()
+        chunks = get_openai_client().chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=messages,
+            stream=True
         )
-        final_response = chat_response.choices[0].message.content
+        for chunk in chunks:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                if not parts:
+                    llm_span.set(first_token_seconds=time.perf_counter() - started)
+                parts.append(text)
+                yield text
+        response = "".join(parts)
+        _record_llm_tokens(llm_span, messages, response)
+        store_summary(cache_key, response)
     except Exception as e:
-        final_response = f"Error generating response: {str(e)}"
+        llm_span.end(e)
+        raise
+    finally:
+        llm_span.end()
 
-    return {
+def prepare_report(
+    research_topic,
+    related_topic,
+    field_of_study,
+    type_of_publication,
+    date_range,
+    keywords,
+    citation_format,
+    open_access_site,
+    search_results=None,
+    max_results=None,
+    backend=None):
+    """
+    Run search, embedding and retrieval for a report outside the job pipeline.
+    Returns (report, messages, cache_key), where report has no response yet
+    and cache_key locates its summary in the response cache, or None when
+    no documents could be embedded.
+    """
+    query = build_search_query(research_topic, related_topic, field_of_study, type_of_publication, keywords)
+
+    # Search the selected sources only when the caller has not already done so
+    with track_upstream_calls() as upstream_calls:
+        if search_results is None:
+            search_results = search_articles(query, date_range, open_access_site, max_results)
+
+    # Collapse the same paper found on several sources or pages
+    articles = dedupe_articles(search_results)
+    docs = prepare_documents_for_embedding(articles)
+    if not docs:
+        logger.warning("No documents were prepared for embedding")
+        return None
+    docs, ids = unique_documents(docs)
+    backend = resolve_backend(backend, len(docs))
+    vector_store = index_documents(docs, ids, backend, make_namespace(uuid.uuid4().hex))
+    context = retrieve_relevant_context(vector_store, query)
+
+    report = {
         'research_topic': research_topic,
-        'response': final_response,
-        'articles': search_results,
+        'response': None,
+        'articles': articles,
         'citation_format': citation_format,
         'field_of_study': field_of_study,
-        'type_of_publication': type_of_publication
-        
-    }
\ No newline at end of file
+        'type_of_publication': type_of_publication,
+        'upstream_calls': dict(upstream_calls)
+    }
+    return report, build_summary_messages(query, context), summary_cache_key(query, context)
+
+def get_chatgpt_response(
+    research_topic,
+    related_topic,
+    field_of_study,
+    type_of_publication,
+    date_range,
+    keywords,
+    citation_format,
+    open_access_site,
+    search_results=None,
+    max_results=None,
+    backend=None):
+    """
+    Generate a report in one call, without a job.
+
+    Pass the articles already returned by search_articles as search_results
+    to skip the source search; otherwise the sources are searched here. The
+    returned dict includes the upstream requests made by this call. Returns
+    None when no documents could be embedded; API errors propagate.
+    """
+    with span("report", research_topic=research_topic) as report_span:
+        prepared = prepare_report(
+            research_topic, related_topic, field_of_study, type_of_publication, date_range,
+            keywords, citation_format, open_access_site, search_results, max_results, backend
+        )
+        if prepared is None:
+            return None
+        report, messages, cache_key = prepared
+        report['response'] = generate_summary(messages, cache_key)
+    report['trace_id'] = report_span.trace_id
+    return report
+
+def stream_chatgpt_response(
+    research_topic,
+    related_topic,
+    field_of_study,
+    type_of_publication,
+    date_range,
+    keywords,
+    citation_format,
+    open_access_site,
+    search_results=None,
+    max_results=None,
+    backend=None):
+    """
+    Streaming variant of get_chatgpt_response.
+    Returns (report, chunks): chunks yields summary text as the model
+    produces it and fills report['response'] once exhausted. Returns None
+    when no documents could be embedded; API errors propagate from chunks.
+    """
+    prepared = prepare_report(
+        research_topic, related_topic, field_of_study, type_of_publication, date_range,
+        keywords, citation_format, open_access_site, search_results, max_results, backend
+    )
+    if prepared is None:
+        return None
+    report, messages, cache_key = prepared
+
+    def chunks():
+        parts = []
+        for text in iter_summary(messages, cache_key):
+            parts.append(text)
+            yield text
+        report['response'] = "".join(parts)
+    return report, chunks()
@@ -0,0 +1,289 @@
+# citation_functions.py
+
+import re
+from string import Formatter, ascii_lowercase
+from functools import lru_cache
+from article_functions import Article, as_article
+
+# Formatted citations kept in memory, keyed by style and article contents
+CITATION_CACHE_SIZE = 1 << 14
+
+# Repository names used in "Retrieved from" text, by URL substring
+SOURCE_LABELS = (
+    ('arxiv.org', 'arXiv'),
+    ('semanticscholar.org', 'Semantic Scholar'),
+    ('core.ac.uk', 'CORE'),
+)
+
+# Each style is a list of templates. The first template whose required
+# fields are all non-empty is used. Text inside [[...]] is optional and only
+# rendered when every field it references is non-empty.
+CITATION_STYLES = {
+    'APA': [
+        '{authors}[[ ({year})]]. {title}. {journal_text}. {source}',
+        '{authors}[[ ({year})]]. {title}. {source}',
+    ],
+    'MLA': [
+        '{authors}. "{title}". {journal_text}[[, {year}]]. {source}',
+        '{authors}. "{title}". {source}[[, {year}]].',
+    ],
+    'Chicago': [
+        '{authors_full}. "{title}." {journal}[[ {volume}]][[, no. {issue}]][[ ({year})]][[: {pages}]].[[ {link}.]]',
+        '{authors_full}. "{title}."[[ {year}.]][[ {link}.]]',
+    ],
+    'IEEE': [
+        '{authors_full}, "{title}," {ieee_details}. [Online]. Available: {link}',
+        '{authors_full}, "{title}," {ieee_details}.',
+        '{authors_full}, "{title}."[[ [Online]. Available: {link}]]',
+    ],
+    'BibTeX': [
+        '@article{{{key},\n'
+        '  title = {{{title}}},\n'
+        '  author = {{{authors_bibtex}}},\n'
+        '[[  year = {{{year}}},\n]]'
+        '[[  journal = {{{journal}}},\n]]'
+        '[[  volume = {{{volume}}},\n]]'
+        '[[  number = {{{issue}}},\n]]'
+        '[[  pages = {{{pages}}},\n]]'
+        '[[  doi = {{{doi}}},\n]]'
+        '[[  url = {{{link}}},\n]]'
+        '}}',
+    ],
+}
+
+CITATION_FORMATS = tuple(CITATION_STYLES)
+
+_OPTIONAL_SEGMENT = re.compile(r'\[\[(.*?)\]\]', re.DOTALL)
+_NON_KEY_CHARS = re.compile(r'[^A-Za-z0-9]+')
+
+# LaTeX replacements for characters that break BibTeX field values
+LATEX_ESCAPES = {
+    '\\': r'\textbackslash{}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+}
+_LATEX_SPECIAL = re.compile('|'.join(re.escape(char) for char in LATEX_ESCAPES))
+
+# BibTeX fields copied verbatim; doi and url are read as URLs, not LaTeX text
+BIBTEX_VERBATIM_FIELDS = ('key', 'doi', 'link')
+
+class CompiledTemplate:
+    """
+    A citation template split once into fixed and optional segments, each a
+    format string with the fields it needs
+    """
+
+    def __init__(self, template):
+        self.segments = []
+        position = 0
+        for match in _OPTIONAL_SEGMENT.finditer(template):
+            if match.start() > position:
+                self._add(template[position:match.start()], optional=False)
+            self._add(match.group(1), optional=True)
+            position = match.end()
+        if position < len(template):
+            self._add(template[position:], optional=False)
+        self.required = {field for text, fields, optional in self.segments if not optional for field in fields}
+
+    def _add(self, text, optional):
+        fields = tuple(field for _, field, _, _ in Formatter().parse(text) if field)
+        self.segments.append((text, fields, optional))
+
+    def applies_to(self, record):
+        return all(record[field] for field in self.required)
+
+    def render(self, record):
+        return ''.join(
+            text.format_map(record)
+            for text, fields, optional in self.segments
+            if not optional or all(record[field] for field in fields)
+        )
+
+@lru_cache(maxsize=None)
+def compile_style(style):
+    """
+    Compiled templates for a citation style; raises ValueError for unknown styles
+    """
+    if style not in CITATION_STYLES:
+        raise ValueError(
+            f"Unsupported citation format: {style}. "
+            f"Choose one of: {', '.join(CITATION_FORMATS)}"
+        )
+    return tuple(CompiledTemplate(template) for template in CITATION_STYLES[style])
+
+def short_authors(authors):
+    if not authors:
+        return "No authors listed"
+    if len(authors) == 1:
+        return authors[0]
+    if len(authors) == 2:
+        return f"{authors[0]} & {authors[1]}"
+    return f"{authors[0]} et al."
+
+def full_authors(authors):
+    """
+    "A", "A and B", "A, B, and C"; lists longer than six are shortened to "A et al."
+    """
+    if not authors:
+        return "No authors listed"
+    if len(authors) > 6:
+        return f"{authors[0]} et al."
+    if len(authors) <= 2:
+        return " and ".join(authors)
+    return f"{', '.join(authors[:-1])}, and {authors[-1]}"
+
+def source_text(url, doi):
+    """
+    Where the article can be found: its DOI link, otherwise its URL
+    labelled with the repository it came from
+    """
+    if doi:
+        return f"DOI: https://doi.org/{doi}"
+    if not url:
+        return 'No URL available'
+    lowered = url.lower()
+    for marker, label in SOURCE_LABELS:
+        if marker in lowered:
+            return f"Retrieved from {label}: {url}"
+    return f"Retrieved from: {url}"
+
+def citation_key(article):
+    """
+    BibTeX key from the first author's last name, the year and the first title word
+    """
+    last_name = article.authors[0].split()[-1] if article.authors else 'anonymous'
+    first_word = next(iter(article.title.split()), 'untitled')
+    year = article.year if article.year != 'N/A' else ''
+    return _NON_KEY_CHARS.sub('', f"{last_name}{year}{first_word}").lower() or 'article'
+
+def latex_escape(text):
+    return _LATEX_SPECIAL.sub(lambda match: LATEX_ESCAPES[match.group()], text)
+
+def citation_keys(articles):
+    """
+    BibTeX keys for a batch of articles. Keys shared by several articles get
+    a, b, c... appended in order, so every entry in the batch can be cited.
+    """
+    keys = [citation_key(article) for article in articles]
+    counts = {}
+    for key in keys:
+        counts[key] = counts.get(key, 0) + 1
+    used = set(keys)
+    unique = []
+    for key in keys:
+        if counts[key] > 1:
+            index = 0
+            while f"{key}{_key_suffix(index)}" in used:
+                index += 1
+            key = f"{key}{_key_suffix(index)}"
+            used.add(key)
+        unique.append(key)
+    return unique
+
+def _key_suffix(index):
+    """
+    a, b, ..., z, aa, ab, ...
+    """
+    suffix = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, len(ascii_lowercase))
+        suffix = ascii_lowercase[remainder] + suffix
+    return suffix
+
+def bibtex_record(record):
+    """
+    A citation record with LaTeX special characters escaped
+    """
+    return {
+        name: value if name in BIBTEX_VERBATIM_FIELDS else latex_escape(value)
+        for name, value in record.items()
+    }
+
+def citation_record(article):
+    """
+    Normalized fields every citation template can reference.
+    An unknown year is left empty so optional year segments drop out.
+    """
+    year = article.year if article.year != 'N/A' else ''
+    journal_info = []
+    if article.journal:
+        journal_info.append(article.journal)
+    if article.volume:
+        journal_info.append(f"Vol. {article.volume}")
+    if article.issue:
+        journal_info.append(f"No. {article.issue}")
+    if article.pages:
+        journal_info.append(f"pp. {article.pages}")
+
+    ieee_details = [
+        article.journal,
+        f"vol. {article.volume}" if article.volume else '',
+        f"no. {article.issue}" if article.issue else '',
+        f"pp. {article.pages}" if article.pages else '',
+        year,
+    ]
+
+    return {
+        'authors': short_authors(article.authors),
+        'authors_full': full_authors(article.authors),
+        'authors_bibtex': ' and '.join(article.authors) or 'Anonymous',
+        'title': article.title,
+        'year': year,
+        'journal': article.journal,
+        'volume': article.volume,
+        'issue': article.issue,
+        'pages': article.pages,
+        'journal_text': ', '.join(journal_info),
+        'ieee_details': ', '.join(part for part in ieee_details if part),
+        'doi': article.doi,
+        'link': f"https://doi.org/{article.doi}" if article.doi else article.url,
+        'source': source_text(article.url, article.doi),
+        'key': citation_key(article),
+    }
+
+def render_citation(templates, record):
+    for template in templates:
+        if template.applies_to(record):
+            return template.render(record)
+    return templates[-1].render(record)
+
+@lru_cache(maxsize=CITATION_CACHE_SIZE)
+def _cached_citation(style, fields, key=None):
+    article = Article(**dict(zip(Article.__slots__, fields)))
+    record = citation_record(article)
+    if key:
+        record['key'] = key
+    if style == 'BibTeX':
+        record = bibtex_record(record)
+    return render_citation(compile_style(style), record)
+
+def format_citation(article, style):
+    """
+    Format one article (an Article or legacy dict) in the given style
+    """
+    return format_citations([article], style)[0]
+
+def format_citations(articles, style):
+    """
+    Format a list of articles in one pass. Citations are memoized by style
+    and article contents, so repeated reference lists render from memory.
+    The key is the full record rather than a DOI or URL, since merged or
+    refreshed records can share an identifier but not their metadata.
+    BibTeX keys are made unique within the list.
+    Raises ValueError for unsupported styles.
+    """
+    compile_style(style)
+    articles = [as_article(article) for article in articles]
+    keys = citation_keys(articles) if style == 'BibTeX' else [None] * len(articles)
+    return [
+        _cached_citation(style, tuple(getattr(article, name) for name in Article.__slots__), key)
+        for article, key in zip(articles, keys)
+    ]
@@ -0,0 +1,198 @@
+# cli.py
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+from article_functions import articles_to_dicts
+from citation_functions import CITATION_FORMATS
+from job_functions import STAGES, JobManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Defaults for spec fields that may be omitted
+SPEC_DEFAULTS = {
+    'related_topic': '',
+    'field_of_study': '',
+    'type_of_publication': '',
+    'keywords': '',
+    'citation_format': 'APA',
+    'open_access_site': ['ArXiv'],
+}
+
+# Default number of reports allowed in each stage at once. Searches are
+# throttled per source anyway; embedding and summaries are bound by API limits.
+DEFAULT_STAGE_LIMITS = {
+    'search': 4,
+    'embed': 2,
+    'retrieve': 4,
+    'summarize': 4,
+    'document': 4,
+}
+
+_NON_SLUG_CHARS = re.compile(r'[^a-z0-9]+')
+
+def parse_date_range(value):
+    """
+    [start, end] years from a two-item list or a "YYYY-YYYY" string
+    """
+    if isinstance(value, str):
+        value = value.split('-')
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError(f"date_range must be [start, end] or \"start-end\", got {value!r}")
+    start, end = (int(year) for year in value)
+    return [start, end]
+
+def load_specs(path):
+    """
+    Read report specs from a JSONL file, one object per line.
+    Fields match the arguments of get_chatgpt_response; research_topic and
+    date_range are required, max_results and name are optional.
+    """
+    specs = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                spec = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})") from e
+            for field in ('research_topic', 'date_range'):
+                if not spec.get(field):
+                    raise ValueError(f"{path}:{line_number}: missing {field}")
+            spec = dict(SPEC_DEFAULTS, **spec)
+            try:
+                spec['date_range'] = parse_date_range(spec['date_range'])
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: {e}") from e
+            if isinstance(spec['open_access_site'], str):
+                spec['open_access_site'] = [spec['open_access_site']]
+            if spec['citation_format'] not in CITATION_FORMATS:
+                raise ValueError(f"{path}:{line_number}: unsupported citation format {spec['citation_format']}")
+            specs.append(spec)
+    return specs
+
+def output_name(index, spec):
+    slug = _NON_SLUG_CHARS.sub('-', (spec.get('name') or spec['research_topic']).lower()).strip('-')
+    return f"{index:03d}_{slug[:60] or 'report'}"
+
+def write_outputs(manager, job_id, spec, output_dir, name):
+    """
+    Copy the job's document and write its report as JSON. Returns the paths.
+    """
+    report = manager.result(job_id)
+    docx_path = os.path.join(output_dir, f"{name}.docx")
+    json_path = os.path.join(output_dir, f"{name}.json")
+    shutil.copyfile(report.pop('document_path'), docx_path)
+    report['articles'] = articles_to_dicts(report['articles'])
+    report['spec'] = spec
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return docx_path, json_path
+
+def stage_timings(status):
+    return {stage: status['stages'][stage]['seconds'] for stage in STAGES}
+
+def format_seconds(value):
+    return '-' if value is None else f"{value:.1f}"
+
+def run_batch(specs, output_dir, stage_limits, job_dir=None, backend=None, max_results=None):
+    """
+    Generate every spec's report concurrently and write its outputs.
+    Returns one result dict per spec, in input order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manager = JobManager(
+        directory=job_dir or os.path.join(output_dir, '.jobs'),
+        workers=max(stage_limits.values()) * 2,
+        stage_limits=stage_limits
+    )
+
+    started = time.perf_counter()
+    jobs = []
+    for spec in specs:
+        request = dict(spec)
+        request.pop('name', None)
+        if backend:
+            request['backend'] = backend
+        if max_results and 'max_results' not in request:
+            request['max_results'] = max_results
+        jobs.append((spec, manager.submit(request)))
+
+    results = []
+    for index, (spec, job_id) in enumerate(jobs, 1):
+        status = manager.wait(job_id)
+        result = {
+            'name': output_name(index, spec),
+            'job_id': job_id,
+            'status': status['status'],
+            'error': status['error'],
+            'seconds': status['updated'] - status['created'],
+            'stages': stage_timings(status),
+        }
+        if status['status'] == 'done':
+            result['docx'], result['json'] = write_outputs(manager, job_id, spec, output_dir, result['name'])
+        results.append(result)
+
+    logger.info(f"Generated {sum(r['status'] == 'done' for r in results)}/{len(results)} reports in {time.perf_counter() - started:.1f}s")
+    return results
+
+def print_timings(results, stream=sys.stdout):
+    header = f"{'report':40} {'status':7} {'total':>7} " + " ".join(f"{stage:>9}" for stage in STAGES)
+    print(header, file=stream)
+    for result in results:
+        stages = " ".join(f"{format_seconds(result['stages'][stage]):>9}" for stage in STAGES)
+        print(f"{result['name'][:40]:40} {result['status']:7} {format_seconds(result['seconds']):>7} {stages}", file=stream)
+        if result['error']:
+            print(f"    error: {result['error']}", file=stream)
+
+def parse_stage_limits(values):
+    """
+    Parse "stage=limit" overrides on top of DEFAULT_STAGE_LIMITS
+    """
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    for value in values or []:
+        stage, _, limit = value.partition('=')
+        if stage not in STAGES or not limit.isdigit() or int(limit) < 1:
+            raise argparse.ArgumentTypeError(f"Invalid stage limit: {value}")
+        limits[stage] = int(limit)
+    return limits
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate LitSCOUT research reports from a JSONL file of report specs")
+    parser.add_argument("specs", help="JSONL file with one report spec per line")
+    parser.add_argument("-o", "--output-dir", default="reports", help="directory for the DOCX/JSON outputs (default: reports)")
+    parser.add_argument(
+        "--stage-limit", action="append", metavar="STAGE=N",
+        help=f"reports allowed in a stage at once, e.g. embed=2 (stages: {', '.join(STAGES)})"
+    )
+    parser.add_argument("--backend", help="vector store backend (pinecone, numpy, chroma or local)")
+    parser.add_argument("--max-results", type=int, help="results per source for specs that do not set max_results")
+    parser.add_argument("--job-dir", help="directory for job state and stage outputs (default: OUTPUT_DIR/.jobs)")
+    parser.add_argument("--timings", help="also write per-spec timings to this JSON file")
+    args = parser.parse_args(argv)
+
+    try:
+        specs = load_specs(args.specs)
+        stage_limits = parse_stage_limits(args.stage_limit)
+    except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+    if not specs:
+        parser.error(f"No report specs found in {args.specs}")
+
+    results = run_batch(specs, args.output_dir, stage_limits, args.job_dir, args.backend, args.max_results)
+    print_timings(results)
+    if args.timings:
+        with open(args.timings, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result['status'] == 'done' for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
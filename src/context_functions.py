@@ -0,0 +1,148 @@
+# context_functions.py
+
+import os
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum prompt tokens spent on retrieved context, and how many chunks are
+# retrieved as candidates for packing
+CONTEXT_TOKEN_BUDGET = int(os.getenv("LITSCOUT_CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_CANDIDATES = int(os.getenv("LITSCOUT_CONTEXT_CANDIDATES", "20"))
+
+# tiktoken encoding used by the chat and embedding models
+TOKENIZER_ENCODING = os.getenv("LITSCOUT_TOKENIZER_ENCODING", "cl100k_base")
+
+# Characters per token assumed when tiktoken is unavailable
+FALLBACK_CHARS_PER_TOKEN = 4
+
+# Shortest suffix/prefix match treated as splitter overlap between two chunks
+MIN_OVERLAP_CHARS = 20
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+def get_encoder():
+    """
+    Return the shared tiktoken encoder, or None if it cannot be loaded
+    (tiktoken missing, or its encoding file cannot be downloaded)
+    """
+    global _encoder, _encoder_loaded
+    with _encoder_lock:
+        if not _encoder_loaded:
+            _encoder_loaded = True
+            try:
+                import tiktoken
+                _encoder = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating token counts from length: {e}")
+        return _encoder
+
+def count_tokens(text):
+    encoder = get_encoder()
+    if encoder is None:
+        return -(-len(text) // FALLBACK_CHARS_PER_TOKEN)
+    return len(encoder.encode(text, disallowed_special=()))
+
+def overlap_length(left, right, min_overlap=MIN_OVERLAP_CHARS):
+    """
+    Length of the longest suffix of left that is also a prefix of right,
+    or 0 when it is shorter than min_overlap
+    """
+    if len(left) < min_overlap or len(right) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    start = max(0, len(left) - len(right))
+    position = left.find(probe, start)
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+def article_key(document):
+    """
+    Identifies the article a chunk was split from
+    """
+    metadata = document.metadata
+    return metadata.get('url') or metadata.get('doi') or metadata.get('title', '')
+
+def scored_candidates(vector_store, query, k):
+    """
+    (document, score) pairs, most relevant first. Stores without relevance
+    scores fall back to rank order.
+    """
+    if hasattr(vector_store, "similarity_search_with_relevance_scores"):
+        try:
+            return vector_store.similarity_search_with_relevance_scores(query, k=k)
+        except NotImplementedError:
+            pass
+    documents = vector_store.similarity_search(query, k=k)
+    return [(doc, 1.0 - i / len(documents)) for i, doc in enumerate(documents)]
+
+def pack_context(scored_documents, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Fill token_budget with the highest-scoring chunks.
+
+    Chunks contained in an already selected chunk are dropped, and text a
+    chunk shares with a neighbouring selected chunk of the same article
+    (the splitter's chunk_overlap) is not paid for twice. Selected chunks are
+    grouped per article, articles ordered by their best score and chunks by
+    their position in the article.
+    Returns (context, stats).
+    """
+    groups = {}
+    used_tokens = 0
+    for position, (doc, score) in enumerate(sorted(scored_documents, key=lambda pair: -pair[1])):
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        key = article_key(doc)
+        group = groups.get(key)
+        if group is not None and any(text in chunk['text'] for chunk in group['chunks']):
+            continue
+
+        # Only the text not already covered by a selected neighbour costs tokens
+        novel = text
+        if group is not None:
+            for chunk in group['chunks']:
+                novel = novel[overlap_length(chunk['text'], novel):]
+                novel = novel[:len(novel) - overlap_length(novel, chunk['text'])]
+        cost = count_tokens(novel)
+        if group is None:
+            header = f"Document {len(groups) + 1}: "
+            cost += count_tokens(header)
+        if used_tokens + cost > token_budget:
+            continue
+
+        used_tokens += cost
+        if group is None:
+            group = groups[key] = {'score': score, 'chunks': []}
+        group['chunks'].append({
+            'text': text,
+            'order': doc.metadata.get('chunk', position)
+        })
+
+    sections = []
+    for i, group in enumerate(sorted(groups.values(), key=lambda g: -g['score'])):
+        pieces = []
+        previous = None
+        for chunk in sorted(group['chunks'], key=lambda c: c['order']):
+            text = chunk['text']
+            if previous is not None:
+                overlap = overlap_length(previous, text)
+                text = text[overlap:] if overlap else "... " + text
+            pieces.append(text)
+            previous = chunk['text']
+        sections.append(f"Document {i + 1}: " + " ".join(piece.strip() for piece in pieces))
+
+    stats = {
+        'chunks': sum(len(group['chunks']) for group in groups.values()),
+        'articles': len(groups),
+        'tokens': used_tokens,
+        'budget': token_budget
+    }
+    return "\n\n".join(sections), stats
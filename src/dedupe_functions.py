@@ -0,0 +1,208 @@
+# dedupe_functions.py
+
+import re
+import hashlib
+import logging
+from functools import lru_cache
+from article_functions import Article, as_article
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Titles whose shingle sets have at least this Jaccard similarity are duplicates
+TITLE_SIMILARITY_THRESHOLD = 0.8
+
+# MinHash signature layout: NUM_BANDS bands of ROWS_PER_BAND hashes each.
+# Pairs above ~0.8 similarity collide in some band with high probability.
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+SHINGLE_SIZE = 4
+
+SIGNATURE_SIZE = NUM_BANDS * ROWS_PER_BAND
+EMPTY_BIN = 1 << 64
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_DOI_PREFIX = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:)', re.IGNORECASE)
+
+def normalize_title(title):
+    """
+    Lowercase a title and collapse punctuation and whitespace to single spaces
+    """
+    return _NON_ALNUM.sub(' ', (title or '').lower()).strip()
+
+def normalize_doi(doi):
+    return _DOI_PREFIX.sub('', (doi or '').strip()).lower()
+
+def title_shingles(normalized_title):
+    """
+    Character shingles of a normalized title
+    """
+    text = normalized_title.replace(' ', '')
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+@lru_cache(maxsize=1 << 16)
+def _shingle_hash(shingle):
+    """
+    Stable 64-bit hash of a shingle, cached since common shingles recur
+    across titles
+    """
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+
+def minhash_signature(shingles):
+    """
+    One-permutation MinHash signature of a shingle set.
+    Each shingle is hashed once into one of SIGNATURE_SIZE bins and the
+    signature holds the minimum hash per bin; empty bins keep EMPTY_BIN.
+    """
+    signature = [EMPTY_BIN] * SIGNATURE_SIZE
+    for shingle in shingles:
+        value = _shingle_hash(shingle)
+        position = value % SIGNATURE_SIZE
+        if value < signature[position]:
+            signature[position] = value
+    return signature
+
+def band_keys(signature):
+    """
+    LSH band keys of a signature, skipping bands made only of empty bins
+    """
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        if any(row != EMPTY_BIN for row in rows):
+            keys.append((band, rows))
+    return keys
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def identifier_keys(article):
+    """
+    DOI, PMID and ArXiv id keys of a record
+    """
+    keys = []
+    if article.doi:
+        keys.append(('doi', normalize_doi(article.doi)))
+    if article.pmid:
+        keys.append(('pmid', article.pmid))
+    if article.arxiv_id:
+        keys.append(('arxiv', article.arxiv_id.lower()))
+    return keys
+
+def identifiers_conflict(a, b):
+    """
+    True when both records carry an identifier of the same type and the
+    values differ, so they cannot be the same paper whatever their titles
+    """
+    a_ids = dict(identifier_keys(a))
+    return any(kind in a_ids and a_ids[kind] != value for kind, value in identifier_keys(b))
+
+def exact_keys(article):
+    """
+    Identifier keys that mark two records as the same paper
+    """
+    keys = identifier_keys(article)
+    title = normalize_title(article.title)
+    if title:
+        keys.append(('title', title))
+    return keys
+
+def merge_articles(primary, duplicate):
+    """
+    Return a copy of primary with empty fields filled from duplicate.
+    The longer abstract and author list win.
+    """
+    merged = Article(**{name: getattr(primary, name) for name in Article.__slots__})
+    for name in Article.__slots__:
+        if not getattr(merged, name):
+            setattr(merged, name, getattr(duplicate, name))
+    if len(duplicate.abstract) > len(merged.abstract):
+        merged.abstract = duplicate.abstract
+    if len(duplicate.authors) > len(merged.authors):
+        merged.authors = duplicate.authors
+    return merged
+
+class ArticleDeduper:
+    """
+    Incremental form of dedupe_articles, for records that arrive in pages.
+    add() merges a record into the survivors seen so far.
+    """
+
+    def __init__(self, threshold=TITLE_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.total = 0
+        self.survivors = []
+        self._shingle_sets = []
+        self._key_index = {}
+        self._band_index = {}
+
+    def add(self, article):
+        """
+        Add one record and return (position of its survivor, True if the
+        record is a new paper rather than a duplicate)
+        """
+        article = as_article(article)
+        self.total += 1
+
+        match = None
+        keys = exact_keys(article)
+        for key in keys:
+            position = self._key_index.get(key)
+            if position is None:
+                continue
+            if key[0] != 'title' or not identifiers_conflict(self.survivors[position], article):
+                match = position
+                break
+
+        shingles = title_shingles(normalize_title(article.title))
+        bands = []
+        if shingles:
+            bands = band_keys(minhash_signature(shingles))
+            if match is None:
+                candidates = {position for band in bands for position in self._band_index.get(band, ())}
+                for position in sorted(candidates):
+                    if identifiers_conflict(self.survivors[position], article):
+                        continue
+                    if jaccard(shingles, self._shingle_sets[position]) >= self.threshold:
+                        match = position
+                        break
+
+        is_new = match is None
+        if is_new:
+            match = len(self.survivors)
+            self.survivors.append(article)
+            self._shingle_sets.append(shingles)
+        else:
+            self.survivors[match] = merge_articles(self.survivors[match], article)
+
+        for key in keys:
+            self._key_index.setdefault(key, match)
+        for band in bands:
+            self._band_index.setdefault(band, []).append(match)
+        return match, is_new
+
+    def log_removed(self):
+        if self.total > len(self.survivors):
+            logger.info(f"Removed {self.total - len(self.survivors)} duplicate articles ({len(self.survivors)} remain)")
+
+def dedupe_articles(articles, threshold=TITLE_SIMILARITY_THRESHOLD):
+    """
+    Collapse records of the same paper across sources and pages.
+
+    Records sharing a DOI, PMID or ArXiv id are merged directly. Remaining
+    records are matched by normalized title, then by title shingles, using
+    MinHash banding to find candidates, and merged when their Jaccard
+    similarity reaches threshold. Title matches are rejected when the two
+    records carry conflicting identifiers of the same type ("Part I" and
+    "Part II" with different PMIDs stay separate). First-seen order is kept
+    and duplicates contribute their metadata to the surviving record.
+    """
+    deduper = ArticleDeduper(threshold)
+    for article in articles:
+        deduper.add(article)
+    deduper.log_removed()
+    return deduper.survivors
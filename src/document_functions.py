@@ -1,23 +1,45 @@
 # document_functions.py
 
 import os
+import io
+import uuid
+from datetime import datetime
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from openai import OpenAI
 from dotenv import load_dotenv
 import json
+from citation_functions import format_citations
+from trace_functions import start_span
 
 # Load environment variables
 load_dotenv()
 
-def create_word_doc_from_json(data, filename='output.docx'):
+# When set, every generated report is also written to this directory
+REPORT_OUTPUT_DIR = os.getenv("LITSCOUT_REPORT_DIR")
+
+def unique_report_path(directory, prefix='research_report'):
+    """
+    Per-report file path that concurrent reports cannot collide on
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(directory, f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}.docx")
+
+def create_word_doc_from_json(data, filename=None, output_dir=REPORT_OUTPUT_DIR):
     """
     Creates a Word document from the provided JSON data.
     
     Args:
         data (dict): Dictionary containing research topic, response, and articles
+        filename (str): Optional path to also save the document to
+        output_dir (str): Optional directory to also save the document to,
+            under a unique per-report name
+
+    Returns:
+        io.BytesIO: The rendered document, rewound to the start. When it was
+        saved to disk, buffer.name holds the path. False on error.
     """
+    docx_span = start_span("docx")
     try:
         # Create a new Word document
         doc = Document()
@@ -38,82 +60,29 @@ def create_word_doc_from_json(data, filename='output.docx'):
         if data.get('articles', []):
             articles_heading = doc.add_heading('Related Articles:', level=1)
             
-            for article in data.get('articles', []):
-                # Format authors
-                authors = article.get('authors', [])
-                if not authors:
-                    author_text = "No authors listed"
-                elif len(authors) == 1:
-                    author_text = authors[0]
-                elif len(authors) == 2:
-                    author_text = f"{authors[0]} & {authors[1]}"
-                else:
-                    author_text = f"{authors[0]} et al."
-                
-                # Extract year from publication date
-                pub_date = article.get('published', '')
-                try:
-                    # Handle string representation of dict
-                    if isinstance(pub_date, str) and pub_date.startswith('{'):
-                        import ast
-                        date_dict = ast.literal_eval(pub_date)
-                        pub_date = date_dict.get('$', '')
-                    pub_year = pub_date.split('-')[0] if pub_date else 'N/A'
-                except:
-                    pub_year = 'N/A'
-                
-                # Format DOI as URL or use alternative URL
-                doi = article.get('doi', '')
-                url = ''
-                if doi:
-                    url = f"https://doi.org/{doi}"
-                    source_text = f"DOI: {url}"
-                else:
-                    # Check for alternative URLs
-                    if article.get('url'):
-                        url = article['url']
-                        # Determine source based on URL
-                        if 'arxiv.org' in url.lower():
-                            source_text = f"Retrieved from arXiv: {url}"
-                        elif 'semanticscholar.org' in url.lower():
-                            source_text = f"Retrieved from Semantic Scholar: {url}"
-                        elif 'core.ac.uk' in url.lower():
-                            source_text = f"Retrieved from CORE: {url}"
-                        else:
-                            source_text = f"Retrieved from: {url}"
-                    else:
-                        source_text = 'No URL available'
-                
-                # Format journal information
-                journal_info = []
-                if article.get('journal'):
-                    journal_info.append(article['journal'])
-                if article.get('volume'):
-                    journal_info.append(f"Vol. {article['volume']}")
-                if article.get('issue'):
-                    journal_info.append(f"No. {article['issue']}")
-                if article.get('pages'):
-                    journal_info.append(f"pp. {article['pages']}")
-                journal_text = ', '.join(filter(None, journal_info))
-                
-                # Create citation based on format
-                if data['citation_format'] == 'APA':
-                    if journal_text:
-                        citation = f"{author_text} ({pub_year}). {article['title']}. {journal_text}. {source_text}"
-                    else:
-                        citation = f"{author_text} ({pub_year}). {article['title']}. {source_text}"
-                elif data['citation_format'] == 'MLA':
-                    if journal_text:
-                        citation = f"{author_text}. \"{article['title']}\". {journal_text}, {pub_year}. {source_text}"
-                    else:
-                        citation = f"{author_text}. \"{article['title']}\". {source_text}, {pub_year}."
-                
+            for citation in format_citations(data.get('articles', []), data['citation_format']):
                 doc.add_paragraph(citation)
         
-        # Save the document
-        doc.save(filename)
-        print(f"Document saved successfully as {filename}")
-        return filename
+        # Render in memory so concurrent reports never share a file
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        buffer.seek(0)
+        docx_span.add("items", len(data.get('articles', [])))
+        docx_span.add("bytes", buffer.getbuffer().nbytes)
+
+        # Optionally keep a copy on disk
+        if filename is None and output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            filename = unique_report_path(output_dir)
+        if filename:
+            with open(filename, 'wb') as f:
+                f.write(buffer.getvalue())
+            buffer.name = filename
+            print(f"Document saved successfully as {filename}")
+        return buffer
     except Exception as e:
+        docx_span.end(e)
         print(f"Error creating document: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+    finally:
+        docx_span.end()
\ No newline at end of file
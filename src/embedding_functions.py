@@ -0,0 +1,223 @@
+# embedding_functions.py
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from langchain_core.embeddings import Embeddings
+from cache_functions import embedding_key, get_embedding_cache
+from context_functions import count_tokens
+from http_functions import backoff_delay, parse_retry_after
+from trace_functions import current_span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Embedding requests are packed up to this many tokens and inputs, and at
+# most EMBEDDING_WORKERS requests are in flight at once
+EMBEDDING_BATCH_TOKENS = int(os.getenv("LITSCOUT_EMBEDDING_BATCH_TOKENS", "8000"))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("LITSCOUT_EMBEDDING_BATCH_MAX_INPUTS", "256"))
+EMBEDDING_WORKERS = int(os.getenv("LITSCOUT_EMBEDDING_WORKERS", "4"))
+
+# Rate-limited batches are split and retried this many times; the token
+# limit halves on each rate limit and recovers by a tenth per success
+EMBEDDING_MAX_RETRIES = int(os.getenv("LITSCOUT_EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_MIN_BATCH_TOKENS = 500
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by the persistent embedding cache.
+    Chunks are keyed by a hash of (model, text); only cache misses are sent
+    to the wrapped embeddings client.
+    """
+
+    def __init__(self, embeddings, model, cache=None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache if cache is not None else get_embedding_cache(model)
+
+    def embed_documents(self, texts):
+        keys = [embedding_key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            logger.info(f"Embedding {len(missing)} uncached chunks out of {len(texts)}")
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), new_vectors)
+            vectors.update(zip(missing, new_vectors))
+
+        return [list(map(float, vectors[key])) for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        return self.cache.stats()
+
+def pack_batches(token_counts, indices, max_tokens, max_items):
+    """
+    Split indices into consecutive batches of at most max_tokens tokens and
+    max_items inputs. An input larger than max_tokens gets its own batch.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for i in indices:
+        if batch and (batch_tokens + token_counts[i] > max_tokens or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += token_counts[i]
+    if batch:
+        batches.append(batch)
+    return batches
+
+def is_rate_limited(error):
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    return parse_retry_after(headers.get("retry-after"))
+
+def _embed_after(delay, embed, texts):
+    if delay:
+        time.sleep(delay)
+    return embed(texts)
+
+class EmbeddingExecutor:
+    """
+    Sends embedding requests in token-packed batches over a bounded thread
+    pool.
+    The batch token limit is shared across runs. It halves whenever the API
+    rate-limits a batch (which is then split and retried after a backoff)
+    and grows back gradually as batches succeed.
+    """
+
+    def __init__(self, workers=EMBEDDING_WORKERS, max_tokens=EMBEDDING_BATCH_TOKENS, max_items=EMBEDDING_BATCH_MAX_INPUTS):
+        self.workers = workers
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.batch_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="litscout-embed")
+
+    def _shrink(self):
+        with self._lock:
+            floor = min(EMBEDDING_MIN_BATCH_TOKENS, self.max_tokens)
+            self.batch_tokens = max(floor, self.batch_tokens // 2)
+            logger.warning(f"Embedding rate limited; batch limit lowered to {self.batch_tokens} tokens")
+
+    def _grow(self):
+        with self._lock:
+            self.batch_tokens = min(self.max_tokens, self.batch_tokens + max(1, self.max_tokens // 10))
+
+    def run(self, texts, embed, on_batch):
+        """
+        Embed texts with embed(list_of_texts) and call
+        on_batch(indices, vectors) in the calling thread as each batch
+        completes, so callers can store results while later batches are
+        still in flight.
+        """
+        if not texts:
+            return
+        token_counts = [count_tokens(text) for text in texts]
+        stage_span = current_span()
+        stage_span.add("items", len(texts))
+        stage_span.add("tokens_in", sum(token_counts))
+        futures = {}
+
+        def submit(indices, attempt=0, delay=0.0):
+            future = self._pool.submit(_embed_after, delay, embed, [texts[i] for i in indices])
+            futures[future] = (indices, attempt)
+
+        for batch in pack_batches(token_counts, range(len(texts)), self.batch_tokens, self.max_items):
+            submit(batch)
+
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    indices, attempt = futures.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        if not is_rate_limited(e) or attempt >= EMBEDDING_MAX_RETRIES:
+                            raise
+                        self._shrink()
+                        delay = backoff_delay(attempt, _retry_after(e))
+                        for batch in pack_batches(token_counts, indices, self.batch_tokens, self.max_items):
+                            submit(batch, attempt + 1, delay)
+                        continue
+                    self._grow()
+                    on_batch(indices, vectors)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+_embedding_executor = None
+_embedding_executor_lock = threading.Lock()
+
+def get_embedding_executor():
+    """
+    Return the process-wide embedding executor
+    """
+    global _embedding_executor
+    with _embedding_executor_lock:
+        if _embedding_executor is None:
+            _embedding_executor = EmbeddingExecutor()
+        return _embedding_executor
+
+def embed_in_batches(embeddings, texts, on_batch, executor=None):
+    """
+    Embed texts through the executor, calling on_batch(indices, vectors) as
+    vectors become available.
+    With CachedEmbeddings, cached vectors are delivered first without an API
+    call, each missing text is embedded once and new vectors are written to
+    the cache as their batch completes.
+    """
+    executor = executor or get_embedding_executor()
+    if not isinstance(embeddings, CachedEmbeddings):
+        executor.run(texts, embeddings.embed_documents, on_batch)
+        return
+
+    keys = [embedding_key(embeddings.model, text) for text in texts]
+    cached = embeddings.cache.get_many(keys)
+    hits = [i for i, key in enumerate(keys) if key in cached]
+    current_span().add("cache_hits", len(hits))
+    for start in range(0, len(hits), executor.max_items):
+        batch = hits[start:start + executor.max_items]
+        on_batch(batch, [cached[keys[i]] for i in batch])
+
+    # Positions of every text sharing a missing key, embedded once per key
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in cached:
+            missing.setdefault(key, []).append(i)
+    current_span().add("cache_misses", len(texts) - len(hits))
+    if not missing:
+        return
+    logger.info(f"Embedding {len(missing)} uncached chunks out of {len(texts)}")
+    missing_keys = list(missing)
+
+    def store(batch, vectors):
+        batch_keys = [missing_keys[j] for j in batch]
+        embeddings.cache.put_many(batch_keys, vectors)
+        indices, expanded = [], []
+        for key, vector in zip(batch_keys, vectors):
+            for i in missing[key]:
+                indices.append(i)
+                expanded.append(vector)
+        on_batch(indices, expanded)
+
+    executor.run([texts[missing[key][0]] for key in missing_keys], embeddings.embeddings.embed_documents, store)
@@ -0,0 +1,357 @@
+# http_functions.py
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Pool settings for hosts without an explicit connection cap
+DEFAULT_POOL_CONNECTIONS = int(os.getenv("LITSCOUT_HTTP_POOL_CONNECTIONS", "10"))
+DEFAULT_POOL_MAXSIZE = int(os.getenv("LITSCOUT_HTTP_POOL_MAXSIZE", "10"))
+
+# Seconds to wait for connect/read when the caller gives no timeout
+DEFAULT_TIMEOUT = float(os.getenv("LITSCOUT_HTTP_TIMEOUT", "30"))
+
+# Maximum open connections per source host. ArXiv asks clients to be gentle,
+# NCBI allows 10 req/s with an API key.
+HOST_CONNECTION_LIMITS = {
+    "export.arxiv.org": 2,
+    "eutils.ncbi.nlm.nih.gov": 10,
+    "api.openaire.eu": 4,
+}
+
+DEFAULT_HEADERS = {
+    "User-Agent": "LitSCOUT/1.0 (+https://github.com/RaizaPagatpatan/litscout)",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+# Requests per second and burst size per source. NCBI allows 10 req/s with
+# an API key and 3 req/s without; ArXiv asks for one request every 3 seconds.
+SOURCE_RATE_LIMITS = {
+    "ArXiv": (1 / 3, 1),
+    "PubMed": (10, 10) if os.getenv("PUBMED_API_KEY") else (3, 3),
+    "OpenAIRE": (5, 5),
+}
+
+# Retry policy for 429/5xx responses and connection errors
+MAX_RETRIES = int(os.getenv("LITSCOUT_HTTP_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("LITSCOUT_HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LITSCOUT_HTTP_BACKOFF_MAX", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Consecutive failed requests before a source is skipped, and for how long
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LITSCOUT_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("LITSCOUT_CIRCUIT_RESET_TIMEOUT", "60"))
+
+_session = None
+_session_lock = threading.Lock()
+_limiters = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+
+class SourceUnavailableError(Exception):
+    """
+    Raised when a source keeps failing after retries or its circuit is open
+    """
+
+    def __init__(self, source, message):
+        super().__init__(f"{source} is unavailable: {message}")
+        self.source = source
+        self.reason = message
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    acquire() blocks the calling thread and acquire_async() suspends the
+    calling task until a token is available. Tokens are reserved under the
+    lock, so concurrent callers are spaced out instead of racing.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Take a token and return how long to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """
+    Stops calling a source after repeated failures.
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast for reset_timeout seconds. A single trial call is then let
+    through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+def get_rate_limiter(source):
+    """
+    Return the shared token bucket for a source, or None if it is unthrottled
+    """
+    with _registry_lock:
+        if source not in _limiters:
+            # None is stored too, so configure_source can turn throttling off
+            # for a source that has a default limit
+            limit = SOURCE_RATE_LIMITS.get(source)
+            _limiters[source] = TokenBucket(*limit) if limit else None
+        return _limiters[source]
+
+def get_circuit_breaker(source):
+    """
+    Return the shared circuit breaker for a source
+    """
+    with _registry_lock:
+        if source not in _breakers:
+            _breakers[source] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+        return _breakers[source]
+
+def configure_source(source, rate=None, burst=1, failure_threshold=None, reset_timeout=None):
+    """
+    Replace the limiter and breaker for a source, e.g. when pointing it at a
+    local stub server. rate=None removes throttling for the source.
+    """
+    with _registry_lock:
+        _limiters[source] = None if rate is None else TokenBucket(rate, burst)
+        _breakers[source] = CircuitBreaker(
+            CIRCUIT_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold,
+            CIRCUIT_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        )
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP date)
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Full-jitter exponential backoff, never shorter than Retry-After
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+def parse_host_limits(value):
+    """
+    Parse a "host=limit,host=limit" string into a dict of connection caps
+    """
+    limits = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        host, limit = item.split("=", 1)
+        try:
+            limits[host.strip()] = int(limit)
+        except ValueError:
+            logger.warning(f"Ignoring invalid host connection limit: {item}")
+    return limits
+
+def get_host_limits():
+    """
+    Per-host connection caps, with overrides from LITSCOUT_HTTP_HOST_LIMITS
+    """
+    limits = dict(HOST_CONNECTION_LIMITS)
+    limits.update(parse_host_limits(os.getenv("LITSCOUT_HTTP_HOST_LIMITS")))
+    return limits
+
+def create_session(host_limits=None):
+    """
+    Build a keep-alive Session with pooled adapters.
+    Hosts in host_limits get their own adapter whose pool blocks once the cap
+    is reached, so concurrent searches queue instead of opening new sockets.
+    """
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+
+    default_adapter = HTTPAdapter(
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE
+    )
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+
+    if host_limits is None:
+        host_limits = get_host_limits()
+    for host, limit in host_limits.items():
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=limit,
+            pool_block=True
+        )
+        session.mount(f"https://{host}", adapter)
+        session.mount(f"http://{host}", adapter)
+
+    return session
+
+def get_session():
+    """
+    Return the process-wide Session, creating it on first use
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+                logger.info("Created shared HTTP session")
+    return _session
+
+def close_session():
+    """
+    Close the shared Session and drop its pooled connections
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def http_get(url, params=None, source=None, **kwargs):
+    """
+    GET through the shared Session with a default timeout.
+    When source is given, the request is throttled by the source's token
+    bucket, retried with backoff on 429/5xx and connection errors, and
+    guarded by its circuit breaker. SourceUnavailableError is raised when the
+    circuit is open, retries run out or the server asks to wait longer than
+    BACKOFF_MAX.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    session = get_session()
+    if source is None:
+        return session.get(url, params=params, **kwargs)
+
+    breaker = get_circuit_breaker(source)
+    if not breaker.allow():
+        raise SourceUnavailableError(source, "circuit open after repeated failures")
+
+    limiter = get_rate_limiter(source)
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire()
+
+        retry_after = None
+        try:
+            response = session.get(url, params=params, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        except Exception:
+            # Not worth retrying, but the breaker must still hear about it or
+            # a failed half-open trial would leave the circuit open for good
+            breaker.record_failure()
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            error = f"HTTP {response.status_code}"
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            response.close()
+
+        if attempt == MAX_RETRIES:
+            break
+        if retry_after is not None and retry_after > BACKOFF_MAX:
+            # Retrying sooner than the server asked would not be honouring it
+            breaker.record_failure()
+            raise SourceUnavailableError(source, f"{error} with Retry-After of {retry_after:.0f}s")
+        delay = backoff_delay(attempt, retry_after)
+        logger.warning(f"{source} request failed ({error}); retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+
+    breaker.record_failure()
+    raise SourceUnavailableError(source, f"{error} after {MAX_RETRIES + 1} attempts")
+
+def response_bytes(response):
+    """
+    Body bytes received so far as sent on the wire, before decompression.
+    For streamed responses this only counts what has been read.
+    """
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        return len(response.content or b"")
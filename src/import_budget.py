@@ -0,0 +1,79 @@
+# import_budget.py
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+# Cold-start import budget per module, in milliseconds
+DEFAULT_BUDGETS = {
+    "search_function": 1500,
+    "chatgpt_functions": 2000,
+}
+
+# Modules that must not be imported until an API client is first needed
+DEFERRED_MODULES = ("openai", "pinecone", "langchain", "langchain_community", "langchain_pinecone")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure_import(module):
+    """
+    Import module in a fresh interpreter with -X importtime.
+    Returns (cumulative milliseconds, set of imported top-level packages).
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_dir, os.getenv("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=src_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+
+    cumulative_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        imported.add(name.split(".")[0])
+        if name == module and len(indent) == 1:
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        raise RuntimeError(f"No import timing reported for {module}")
+    return cumulative_us / 1000, imported
+
+def check_budgets(budgets):
+    """
+    Measure each module and return the number of budget violations
+    """
+    failures = 0
+    for module, budget_ms in budgets.items():
+        elapsed_ms, imported = measure_import(module)
+        eager = sorted(set(DEFERRED_MODULES) & imported)
+        status = "ok" if elapsed_ms <= budget_ms and not eager else "FAIL"
+        print(f"{status:4} {module}: {elapsed_ms:.0f} ms (budget {budget_ms} ms)")
+        if eager:
+            print(f"     eagerly imports: {', '.join(eager)}")
+        if status != "ok":
+            failures += 1
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold-start import time of LitSCOUT modules")
+    parser.add_argument(
+        "budgets", nargs="*", metavar="MODULE[=MS]",
+        help="modules to check, optionally with a budget in milliseconds"
+    )
+    args = parser.parse_args(argv)
+
+    budgets = {}
+    for item in args.budgets:
+        module, _, budget = item.partition("=")
+        budgets[module] = int(budget) if budget else DEFAULT_BUDGETS.get(module, 2000)
+    return 1 if check_budgets(budgets or DEFAULT_BUDGETS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
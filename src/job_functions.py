@@ -0,0 +1,452 @@
+# job_functions.py
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from article_functions import articles_from_dicts, articles_to_dicts
+from cache_functions import CACHE_DIR
+from dedupe_functions import ArticleDeduper
+from search_function import search_articles_federated, track_upstream_calls
+from trace_functions import span
+from vector_store_functions import make_namespace, resolve_backend, unique_documents
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job state and stage outputs live under JOB_DIR, one directory per job
+JOB_DIR = os.getenv("LITSCOUT_JOB_DIR", os.path.join(CACHE_DIR, "jobs"))
+JOB_WORKERS = int(os.getenv("LITSCOUT_JOB_WORKERS", "4"))
+
+# Finished jobs older than this are deleted when the job manager starts and
+# then at most once per JOB_PRUNE_INTERVAL seconds as jobs finish
+JOB_TTL = float(os.getenv("LITSCOUT_JOB_TTL", str(7 * 24 * 3600)))
+JOB_PRUNE_INTERVAL = float(os.getenv("LITSCOUT_JOB_PRUNE_INTERVAL", "3600"))
+
+STAGES = ("search", "embed", "retrieve", "summarize", "document")
+
+# Request fields, matching the arguments of get_chatgpt_response
+REQUEST_FIELDS = (
+    "research_topic", "related_topic", "field_of_study", "type_of_publication",
+    "date_range", "keywords", "citation_format", "open_access_site"
+)
+
+class StageError(Exception):
+    """
+    Raised when a stage cannot produce its output
+    """
+
+def _write_json(path, data):
+    # Write to a temporary file first so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+class JobManager:
+    """
+    Runs report requests as background jobs on a worker pool.
+
+    Each job runs STAGES in order. Every stage's output is written to the
+    job directory as it completes, so a retried or restarted job resumes at
+    the first stage without output. status() exposes per-stage progress and
+    the summary text generated so far for polling UIs. Articles are embedded
+    while the search stage is still receiving pages; the embed stage only
+    finishes that work.
+    """
+
+    def __init__(self, directory=JOB_DIR, workers=JOB_WORKERS, stage_limits=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="litscout-job")
+        # Optional cap on how many jobs may run each stage at once
+        self._stage_slots = {
+            stage: threading.BoundedSemaphore(limit) for stage, limit in (stage_limits or {}).items()
+        }
+        self._lock = threading.Lock()
+        self._states = {}
+        self._partial = {}
+        self._stores = {}
+        self._indexes = {}
+        self._active = set()
+        self._last_prune = time.time()
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def _state_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), "job.json")
+
+    def _stage_path(self, job_id, stage):
+        return os.path.join(self._job_dir(job_id), f"{stage}.json")
+
+    def _load_state(self, job_id):
+        if job_id not in self._states:
+            path = self._state_path(job_id)
+            if not os.path.exists(path):
+                return None
+            self._states[job_id] = _read_json(path)
+        return self._states[job_id]
+
+    def _update(self, job_id, changes, stage=None):
+        """
+        Apply changes to a job's state, or to one stage's entry, and persist it
+        """
+        with self._lock:
+            state = self._load_state(job_id)
+            (state['stages'][stage] if stage else state).update(changes)
+            state['updated'] = time.time()
+            _write_json(self._state_path(job_id), state)
+
+    def submit(self, request):
+        """
+        Queue a report request and return its job ID.
+        request holds REQUEST_FIELDS plus optional max_results, backend and
+        write_document (False skips saving the Word document, for callers
+        that render it themselves).
+        """
+        missing = [field for field in REQUEST_FIELDS if field not in request]
+        if missing:
+            raise ValueError(f"Report request is missing fields: {', '.join(missing)}")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        state = {
+            'id': job_id,
+            'request': request,
+            'status': 'queued',
+            'stage': None,
+            'error': None,
+            'stages': {stage: {'status': 'pending', 'seconds': None, 'error': None} for stage in STAGES},
+            'created': now,
+            'updated': now
+        }
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        with self._lock:
+            self._states[job_id] = state
+            _write_json(self._state_path(job_id), state)
+        self._schedule(job_id)
+        return job_id
+
+    def _schedule(self, job_id):
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        self._pool.submit(self._run, job_id)
+
+    def retry(self, job_id):
+        """
+        Re-run a failed job from the stage that failed
+        """
+        with self._lock:
+            state = self._load_state(job_id)
+        if state is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if state['status'] != 'failed':
+            return
+        self._update(job_id, {'status': 'queued', 'error': None})
+        self._schedule(job_id)
+
+    def status(self, job_id):
+        """
+        Snapshot of a job's state with its progress (0 to 1) and any summary
+        text generated so far, or None for unknown jobs
+        """
+        with self._lock:
+            state = self._load_state(job_id)
+            if state is None:
+                return None
+            snapshot = json.loads(json.dumps(state))
+            snapshot['partial_response'] = self._partial.get(job_id, '')
+        done = sum(1 for stage in STAGES if snapshot['stages'][stage]['status'] == 'done')
+        snapshot['progress'] = done / len(STAGES)
+        return snapshot
+
+    def wait(self, job_id, timeout=None, poll_interval=0.5):
+        """
+        Block until a job is done or failed and return its status
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(job_id)
+            if status is None or status['status'] in ('done', 'failed'):
+                return status
+            if deadline is not None and time.monotonic() >= deadline:
+                return status
+            time.sleep(poll_interval)
+
+    def stage_output(self, job_id, stage):
+        path = self._stage_path(job_id, stage)
+        return _read_json(path) if os.path.exists(path) else None
+
+    def result(self, job_id):
+        """
+        The finished report (topic, summary, articles and citation settings),
+        plus the path of the saved document (None when write_document was
+        off) and the ID of its latest trace; None until the job is done
+        """
+        status = self.status(job_id)
+        if status is None or status['status'] != 'done':
+            return None
+        request = status['request']
+        search = self.stage_output(job_id, 'search')
+        return {
+            'research_topic': request['research_topic'],
+            'response': self.stage_output(job_id, 'summarize')['response'],
+            'articles': articles_from_dicts(search['articles']),
+            'citation_format': request['citation_format'],
+            'field_of_study': request['field_of_study'],
+            'type_of_publication': request['type_of_publication'],
+            'upstream_calls': search['upstream_calls'],
+            'source_errors': search.get('source_errors', {}),
+            'document_path': self.stage_output(job_id, 'document')['path'],
+            'trace_id': status.get('trace_id')
+        }
+
+    def recover(self):
+        """
+        Resume jobs left queued or running by a previous process and prune
+        finished jobs
+        """
+        resumed = 0
+        for job_id in os.listdir(self.directory):
+            try:
+                with self._lock:
+                    state = self._load_state(job_id)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable job {job_id}: {e}")
+                continue
+            if state is None:
+                continue
+            if state['status'] in ('queued', 'running'):
+                self._schedule(job_id)
+                resumed += 1
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished report jobs")
+        self.prune()
+
+    def prune(self, ttl=None):
+        """
+        Delete finished jobs older than ttl (JOB_TTL by default) and drop the
+        in-memory state of the other finished jobs, which is reloaded from
+        disk if they are polled again. Returns the number of jobs deleted.
+        """
+        ttl = JOB_TTL if ttl is None else ttl
+        with self._lock:
+            self._last_prune = time.time()
+            # Finished states are only cached; the job file stays authoritative
+            for job_id in [job_id for job_id in self._states if job_id not in self._active]:
+                if self._states[job_id]['status'] in ('done', 'failed'):
+                    del self._states[job_id]
+
+        removed = 0
+        for job_id in os.listdir(self.directory):
+            path = self._state_path(job_id)
+            try:
+                state = _read_json(path) if os.path.exists(path) else None
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable job {job_id}: {e}")
+                continue
+            if state is None or state['status'] not in ('done', 'failed'):
+                continue
+            if time.time() - state['updated'] > ttl:
+                with self._lock:
+                    if job_id in self._active:
+                        continue
+                    self._states.pop(job_id, None)
+                shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Deleted {removed} finished report jobs older than {ttl:.0f}s")
+        return removed
+
+    def _prune_if_due(self):
+        with self._lock:
+            due = time.time() - self._last_prune >= JOB_PRUNE_INTERVAL
+            if due:
+                self._last_prune = time.time()
+        if due:
+            try:
+                self.prune()
+            except OSError as e:
+                logger.warning(f"Pruning finished jobs failed: {e}")
+
+    def _run(self, job_id):
+        try:
+            with span("report", job_id=job_id) as report_span:
+                # A resumed job starts a new trace; the latest one is kept
+                self._update(job_id, {'status': 'running', 'trace_id': report_span.trace_id})
+                for stage in STAGES:
+                    if self.status(job_id)['stages'][stage]['status'] == 'done':
+                        continue
+                    self._run_stage(job_id, stage)
+            self._update(job_id, {'status': 'done', 'stage': None})
+            logger.info(f"Report job {job_id} finished")
+        except Exception as e:
+            logger.error(f"Report job {job_id} failed: {e}")
+            self._update(job_id, {'status': 'failed', 'error': str(e)})
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+                self._partial.pop(job_id, None)
+                self._stores.pop(job_id, None)
+                index = self._indexes.pop(job_id, None)
+            if index is not None:
+                index.close()
+            self._prune_if_due()
+
+    def _run_stage(self, job_id, stage):
+        self._update(job_id, {'stage': stage})
+        slots = self._stage_slots.get(stage)
+        with slots or nullcontext(), span(f"stage.{stage}", job_id=job_id):
+            self._update(job_id, {'status': 'running', 'error': None}, stage)
+            started = time.perf_counter()
+            try:
+                output = getattr(self, f"_stage_{stage}")(job_id, self.status(job_id)['request'])
+            except Exception as e:
+                self._update(job_id, {'status': 'failed', 'error': str(e), 'seconds': time.perf_counter() - started}, stage)
+                raise
+        _write_json(self._stage_path(job_id, stage), output)
+        self._update(job_id, {'status': 'done', 'seconds': time.perf_counter() - started}, stage)
+
+    def _query(self, request):
+        from chatgpt_functions import build_search_query
+        return build_search_query(
+            request['research_topic'], request['related_topic'], request['field_of_study'],
+            request['type_of_publication'], request['keywords']
+        )
+
+    def _stage_search(self, job_id, request):
+        query = self._query(request)
+        sources = request['open_access_site']
+        # Sources that could not be searched, kept on the stage so the UI can
+        # tell them apart from a search that found nothing
+        source_errors = {}
+
+        # Articles are deduplicated as pages arrive and new ones are embedded
+        # right away; the embed stage waits for the rest
+        from chatgpt_functions import IncrementalIndex
+        deduper = ArticleDeduper()
+        index = IncrementalIndex(request.get('backend'), make_namespace(job_id))
+        with self._lock:
+            self._indexes[job_id] = index
+
+        def add_page(source, page):
+            found = [deduper.survivors[position] for position, is_new in map(deduper.add, page) if is_new]
+            index.add(found)
+
+        try:
+            with track_upstream_calls() as upstream_calls:
+                search_articles_federated(
+                    query, request['date_range'], [sources] if isinstance(sources, str) else sources,
+                    on_result=add_page, max_results=request.get('max_results'), errors=source_errors
+                )
+        finally:
+            self._update(job_id, {'source_errors': source_errors}, 'search')
+        deduper.log_removed()
+        articles = deduper.survivors
+        if not articles:
+            raise StageError("No articles found for this search")
+        logger.info(f"Job {job_id}: found {len(articles)} articles")
+        return {
+            'query': query,
+            'articles': articles_to_dicts(articles),
+            'upstream_calls': dict(upstream_calls),
+            'source_errors': source_errors
+        }
+
+    def _index(self, job_id, request, articles):
+        from chatgpt_functions import index_documents, prepare_documents_for_embedding
+        docs = prepare_documents_for_embedding(articles)
+        if not docs:
+            raise StageError("No documents were prepared for embedding")
+        docs, ids = unique_documents(docs)
+        backend = resolve_backend(request.get('backend'), len(docs))
+        namespace = make_namespace(job_id)
+        store = index_documents(docs, ids, backend, namespace)
+        with self._lock:
+            self._stores[job_id] = store
+        return {'namespace': namespace, 'backend': backend, 'chunk_ids': ids}
+
+    def _stage_embed(self, job_id, request):
+        search = self.stage_output(job_id, 'search')
+        articles = articles_from_dicts(search['articles'])
+        with self._lock:
+            index = self._indexes.pop(job_id, None)
+        if index is None:
+            # Resumed after a restart, so nothing was embedded during the search
+            return self._index(job_id, request, articles)
+        try:
+            store, backend, ids = index.finish(articles)
+        except ValueError as e:
+            raise StageError(str(e)) from e
+        with self._lock:
+            self._stores[job_id] = store
+        return {'namespace': index.namespace, 'backend': backend, 'chunk_ids': ids}
+
+    def _stage_retrieve(self, job_id, request):
+        from chatgpt_functions import open_vector_store, retrieve_relevant_context
+        search = self.stage_output(job_id, 'search')
+        embed = self.stage_output(job_id, 'embed')
+        with self._lock:
+            store = self._stores.get(job_id)
+        if store is None:
+            # Persisted backends are reopened; the in-process store is rebuilt,
+            # which costs no API calls when the embeddings are cached
+            store = open_vector_store(embed['backend'], embed['namespace'])
+        if store is None:
+            self._index(job_id, request, articles_from_dicts(search['articles']))
+            with self._lock:
+                store = self._stores[job_id]
+        return {'context': retrieve_relevant_context(store, search['query'])}
+
+    def _stage_summarize(self, job_id, request):
+        from chatgpt_functions import build_summary_messages, iter_summary, summary_cache_key
+        query = self.stage_output(job_id, 'search')['query']
+        context = self.stage_output(job_id, 'retrieve')['context']
+        parts = []
+        for text in iter_summary(build_summary_messages(query, context), summary_cache_key(query, context)):
+            parts.append(text)
+            with self._lock:
+                self._partial[job_id] = "".join(parts)
+        return {'response': "".join(parts)}
+
+    def _stage_document(self, job_id, request):
+        from document_functions import create_word_doc_from_json
+        if not request.get('write_document', True):
+            return {'path': None}
+        search = self.stage_output(job_id, 'search')
+        report = {
+            'research_topic': request['research_topic'],
+            'response': self.stage_output(job_id, 'summarize')['response'],
+            'articles': search['articles'],
+            'citation_format': request['citation_format']
+        }
+        path = os.path.join(self._job_dir(job_id), "report.docx")
+        if not create_word_doc_from_json(report, filename=path):
+            raise StageError("The Word document could not be created")
+        return {'path': path}
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """
+    Return the process-wide job manager, resuming unfinished jobs on first use
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+            _job_manager.recover()
+        return _job_manager
@@ -7,6 +7,15 @@ import time
 import os
 from dotenv import load_dotenv
 import xml.etree.ElementTree as ET
+import io
+import queue
+import threading
+import contextvars
+from contextlib import contextmanager
+from http_functions import SourceUnavailableError, http_get, response_bytes
+from article_functions import Article, articles_from_dicts, articles_to_dicts, parse_arxiv_id
+from cache_functions import SEARCH_CACHE_ENABLED, get_search_cache, make_search_key
+from trace_functions import span, start_span, use_span
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,96 +23,401 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-def search_articles(query, date_range, open_access_site):
+# Global deadline in seconds for a federated search across several sources
+FEDERATED_SEARCH_TIMEOUT = float(os.getenv("LITSCOUT_FEDERATED_SEARCH_TIMEOUT", "30"))
+
+# Result counts used when the caller does not ask for more
+DEFAULT_MAX_RESULTS = {'arxiv': 10, 'pubmed': 20, 'openaire': 10}
+
+# Page sizes used by the paginated fetchers
+DEFAULT_PAGE_SIZES = {'arxiv': 100, 'pubmed': 200, 'openaire': 50}
+
+# API endpoints, overridable to point the fetchers at a local stub server
+ARXIV_API_URL = os.getenv("LITSCOUT_ARXIV_URL", "http://export.arxiv.org/api/query")
+PUBMED_API_URL = os.getenv("LITSCOUT_PUBMED_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+OPENAIRE_API_URL = os.getenv("LITSCOUT_OPENAIRE_URL", "https://api.openaire.eu/search/publications")
+
+# Stack of active upstream call counters (see track_upstream_calls)
+_upstream_call_counters = contextvars.ContextVar('upstream_call_counters', default=())
+
+@contextmanager
+def track_upstream_calls():
     """
-    Search articles based on selected database
+    Count the upstream API requests made inside the block.
+    Yields a dict mapping source name to number of requests. Trackers nest,
+    so an outer tracker also sees the calls counted by inner ones.
     """
-    if open_access_site.lower() == "arxiv":
-        print("Searching Arxiv...")
-        return search_arxiv_articles(query, date_range)
-    elif open_access_site.lower() == "pubmed":
-        print("Searching PubMed...")
-        return search_pubmed_articles(query, date_range)
-    elif open_access_site.lower() == "openaire":
-        print("Searching OpenAIRE...")
-        return search_openaire_articles(query, date_range)
-    else:
+    counts = {}
+    token = _upstream_call_counters.set(_upstream_call_counters.get() + (counts,))
+    try:
+        yield counts
+    finally:
+        _upstream_call_counters.reset(token)
+
+def _record_upstream_call(source):
+    """
+    Record one upstream request against every active tracker
+    """
+    for counts in _upstream_call_counters.get():
+        counts[source] = counts.get(source, 0) + 1
+
+def search_articles(query, date_range, open_access_site, max_results=None):
+    """
+    Search articles based on selected database.
+    A list of databases runs a federated search across all of them.
+    max_results overrides the per-source default result count.
+    """
+    if isinstance(open_access_site, (list, tuple, set)):
+        return search_articles_federated(query, date_range, open_access_site, max_results=max_results)
+
+    with span("search", source=open_access_site) as search_span:
+        if not SEARCH_CACHE_ENABLED:
+            articles = _search_source(query, date_range, open_access_site, max_results)
+        else:
+            misses = []
+
+            def fetch():
+                misses.append(open_access_site)
+                return articles_to_dicts(_search_source(query, date_range, open_access_site, max_results))
+
+            # Empty results are not cached since fetchers also return [] on errors
+            cached = get_search_cache().get_or_fetch(
+                make_search_key(query, date_range, open_access_site, max_results), fetch
+            )
+            search_span.add("cache_misses" if misses else "cache_hits")
+            articles = articles_from_dicts(cached)
+        search_span.add("items", len(articles))
+    return articles
+
+def _search_source(query, date_range, open_access_site, max_results=None):
+    """
+    Search a single database without caching
+    """
+    source = open_access_site.lower()
+    if source not in SOURCE_PAGE_ITERATORS:
         logger.error(f"Unsupported database: {open_access_site}")
         return []
 
+    print(f"Searching {open_access_site}...")
+    articles = []
+    for page in iter_article_pages(query, date_range, source, max_results=max_results):
+        articles.extend(page)
+    return articles
+
+def iter_article_pages(query, date_range, open_access_site, max_results=None, page_size=None):
+    """
+    Yield batches of articles from one database as each page arrives.
+    Defaults to the source's historical result count when max_results is None.
+    """
+    source = open_access_site.lower()
+    if source not in SOURCE_PAGE_ITERATORS:
+        logger.error(f"Unsupported database: {open_access_site}")
+        return iter(())
+
+    if max_results is None:
+        max_results = DEFAULT_MAX_RESULTS[source]
+    if page_size is None:
+        page_size = min(max_results, DEFAULT_PAGE_SIZES[source])
+    return SOURCE_PAGE_ITERATORS[source](query, date_range, max_results=max_results, page_size=page_size)
+
+class SearchUnavailableError(SourceUnavailableError):
+    """
+    Raised when none of the sources of a federated search could be searched.
+    errors maps each source to the reason it failed.
+    """
+
+    def __init__(self, errors):
+        Exception.__init__(self, "; ".join(f"{source} is unavailable: {reason}" for source, reason in errors.items()))
+        self.source = ", ".join(errors)
+        self.reason = "no source could be searched"
+        self.errors = errors
+
+def search_articles_federated(query, date_range, sources, timeout=None, on_result=None, max_results=None, errors=None):
+    """
+    Search several databases concurrently and merge their pages as they arrive.
+    Sources that fail are skipped and a source that misses the global
+    deadline keeps the pages it delivered, so the result may be partial;
+    the reasons are recorded in errors when a dict is given.
+    SearchUnavailableError is raised when every source failed.
+    on_result(source, articles) is called per page.
+    """
+    if errors is None:
+        errors = {}
+    articles = []
+    for source, page in iter_federated_pages(query, date_range, sources, timeout, max_results, errors):
+        articles.extend(page)
+        if on_result is not None:
+            on_result(source, page)
+    if errors and len(errors) == len(dict.fromkeys(sources)):
+        raise SearchUnavailableError(errors)
+    return articles
+
+def iter_federated_pages(query, date_range, sources, timeout=None, max_results=None, errors=None):
+    """
+    Yield (source, articles) pages from several databases searched
+    concurrently, in arrival order.
+    Each source is paged by its own worker thread, started right away so the
+    deadline is never spent waiting for a free worker. Once timeout seconds have passed
+    the pages received so far are kept, nothing more is yielded and the
+    workers stop after their current request. Sources that fail, or time out
+    before delivering anything, are added to errors with the reason.
+    """
+    if errors is None:
+        errors = {}
+    if timeout is None:
+        timeout = FEDERATED_SEARCH_TIMEOUT
+    sources = list(dict.fromkeys(sources))
+
+    # Not made the current span, since the caller's code runs between yields
+    search_span = start_span("federated_search", sources=", ".join(sources))
+    pages = queue.Queue()
+    stopped = threading.Event()
+    for source in sources:
+        # Copy the context so upstream call tracking and tracing follow the worker thread
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run,
+            args=(_page_source_worker, query, date_range, source, max_results, pages, stopped, search_span),
+            name=f"litscout-search-{source}",
+            daemon=True
+        ).start()
+
+    started = time.monotonic()
+    received = dict.fromkeys(sources, 0)
+    pending = set(sources)
+    try:
+        while pending:
+            try:
+                source, kind, value = pages.get(timeout=max(0.0, started + timeout - time.monotonic()))
+            except queue.Empty:
+                partial = [f"{source} ({received[source]} articles)" for source in sources if source in pending]
+                logger.warning(f"Federated search deadline of {timeout}s reached; stopped {', '.join(partial)}")
+                for source in pending:
+                    if not received[source]:
+                        errors[source] = f"no response within {timeout:g}s"
+                break
+
+            if kind == 'page':
+                received[source] += len(value)
+                search_span.add("items", len(value))
+                yield source, value
+            elif kind == 'done':
+                pending.discard(source)
+                logger.info(f"{source} returned {received[source]} articles after {time.monotonic() - started:.2f}s")
+            else:
+                pending.discard(source)
+                logger.error(f"Federated search failed for {source}: {value}")
+                if not received[source]:
+                    errors[source] = getattr(value, 'reason', None) or str(value) or type(value).__name__
+    finally:
+        stopped.set()
+        search_span.end()
+
+    logger.info(f"Federated search returned {sum(received.values())} articles from {len(sources)} sources")
+
+def _page_source_worker(query, date_range, source, max_results, pages, stopped, parent_span):
+    """
+    Put (source, kind, value) messages on pages: one 'page' per batch of
+    articles, then 'done' or 'error' with the exception
+    """
+    try:
+        with use_span(parent_span):
+            for page in _iter_source_pages(query, date_range, source, max_results, stopped):
+                pages.put((source, 'page', page))
+    except Exception as e:
+        pages.put((source, 'error', e))
+    else:
+        pages.put((source, 'done', None))
+
+def _iter_source_pages(query, date_range, source, max_results, stopped):
+    """
+    Yield pages of one database, serving a cached result as a single page.
+    Fetching stops early once stopped is set; only complete results are
+    written to the search cache.
+    """
+    with span("search", source=source) as search_span:
+        if stopped.is_set():
+            return
+        key = make_search_key(query, date_range, source, max_results)
+        if SEARCH_CACHE_ENABLED:
+            cached = get_search_cache().get_or_refresh(
+                key, lambda: articles_to_dicts(_search_source(query, date_range, source, max_results))
+            )
+            search_span.add("cache_misses" if cached is None else "cache_hits")
+            if cached is not None:
+                articles = articles_from_dicts(cached)
+                search_span.add("items", len(articles))
+                if articles:
+                    yield articles
+                return
+
+        fetched = []
+        for page in iter_article_pages(query, date_range, source, max_results=max_results):
+            fetched.extend(page)
+            search_span.add("items", len(page))
+            yield page
+            if stopped.is_set():
+                search_span.set(partial=True)
+                return
+
+        # Empty results are not cached since fetchers also return [] on errors
+        if SEARCH_CACHE_ENABLED and fetched:
+            get_search_cache().set(key, articles_to_dicts(fetched))
+
 def search_arxiv_articles(
-    query, date_range):
+    query, date_range, max_results=DEFAULT_MAX_RESULTS['arxiv']):
     """Searches for articles on ArXiv based on the query and date range."""
-    
+    articles = []
+    for page in iter_arxiv_pages(query, date_range, max_results=max_results, page_size=max_results):
+        articles.extend(page)
+
+    logger.info(f"Total articles found: {len(articles)}")
+    return articles
+
+def iter_arxiv_pages(query, date_range, max_results=100, page_size=50):
+    """
+    Yield ArXiv articles page by page, driving the API's start offset.
+    Articles outside the date range are dropped, so pages may be short.
+    """
     start_year, end_year = date_range
     logger.info(f"Searching ArXiv with query: {query}")
     logger.info(f"Date range: {start_year} - {end_year}")
     
-    base_url = "http://export.arxiv.org/api/query"
-    params = {
-        "search_query": query,
-        "start": 0,
-        "max_results": 10,
-        "sortBy": "relevance",
-        "sortOrder": "descending"
-    }
-    try:
-        logger.info(f"Sending request to ArXiv with params: {params}")
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        
-        logger.info(f"Received response from ArXiv. Status code: {response.status_code}")
-        
-        # Parse XML response
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(response.content)
-        
-        # Define namespaces
-        ns = {
-            'atom': 'http://www.w3.org/2005/Atom',
-            'arxiv': 'http://arxiv.org/schemas/atom'
+    base_url = ARXIV_API_URL
+    start = 0
+    while start < max_results:
+        params = {
+            "search_query": query,
+            "start": start,
+            "max_results": min(page_size, max_results - start),
+            "sortBy": "relevance",
+            "sortOrder": "descending"
         }
-        articles = []
-        for entry in root.findall('atom:entry', ns):
-            try:
-                title = entry.find('atom:title', ns).text
-                summary = entry.find('atom:summary', ns).text
-                published = entry.find('atom:published', ns).text
-                url = entry.find('atom:id', ns).text
-                
-                # Extract authors
-                authors = [author.find('atom:name', ns).text for author in entry.findall('atom:author', ns)]
-                
-                # Check publication year
-                published_year = datetime.strptime(published, "%Y-%m-%dT%H:%M:%SZ").year
+        try:
+            logger.info(f"Sending request to ArXiv with params: {params}")
+            _record_upstream_call('ArXiv')
+            with span("fetch", source='ArXiv') as fetch_span, \
+                    http_get(base_url, params=params, source='ArXiv', stream=True) as response:
+                response.raise_for_status()
                 
-                if start_year <= published_year <= end_year:
-                    article = {
-                        'title': title,
-                        'summary': summary,
-                        'authors': authors,
-                        'published': published,
-                        'url': url
-                    }
-                    articles.append(article)
-                    logger.info(f"Added article: {title}")
-            except Exception as e:
-                logger.error(f"Error processing article: {e}")
-        
-        logger.info(f"Total articles found: {len(articles)}")
-        return articles
-    except requests.RequestException as e:
-        logger.error(f"Error retrieving data from ArXiv: {e}")
-        return []
+                logger.info(f"Received response from ArXiv. Status code: {response.status_code}")
+                # The body is streamed into the parser, so parsing includes reading it
+                with span("parse", source='ArXiv') as parse_span:
+                    articles, entry_count = _parse_arxiv_feed(_response_stream(response), date_range)
+                    parse_span.add("items", len(articles))
+                fetch_span.add("bytes", response_bytes(response))
+        except requests.RequestException as e:
+            # 4xx responses and other request errors that http_get does not retry
+            logger.error(f"Error retrieving data from ArXiv: {e}")
+            raise SourceUnavailableError('ArXiv', str(e)) from e
+        except ET.ParseError as e:
+            logger.error(f"Failed to parse ArXiv XML response: {e}")
+            return
+
+        if articles:
+            yield articles
+        if entry_count < params["max_results"]:
+            return
+        start += entry_count
+
+def _response_stream(response):
+    """
+    File-like view of a streamed response body with gzip/deflate decoded
+    """
+    response.raw.decode_content = True
+    return response.raw
 
-def search_pubmed_articles(query, date_range):
+def _iter_xml_elements(source, tag):
+    """
+    Incrementally parse XML from a file-like object or bytes, yielding each
+    completed tag element. Elements are cleared once the caller moves on, so
+    memory is bounded by one record instead of the whole document.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if root is None:
+            root = elem
+        if event == 'end' and elem.tag == tag:
+            yield elem
+            elem.clear()
+            # Drop the cleared record from the root so it can be collected
+            root.clear()
+
+ATOM_NS = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'arxiv': 'http://arxiv.org/schemas/atom'
+}
+ATOM_ENTRY_TAG = '{http://www.w3.org/2005/Atom}entry'
+
+def _parse_arxiv_feed(source, date_range):
+    """
+    Stream-parse an ArXiv Atom feed from a file-like object or bytes.
+    Returns (articles within the date range, number of entries in the feed).
+    """
+    start_year, end_year = date_range
+    ns = ATOM_NS
+    articles = []
+    entry_count = 0
+    for entry in _iter_xml_elements(source, ATOM_ENTRY_TAG):
+        entry_count += 1
+        try:
+            title = entry.find('atom:title', ns).text
+            summary = entry.find('atom:summary', ns).text
+            published = entry.find('atom:published', ns).text
+            url = entry.find('atom:id', ns).text
+            doi_elem = entry.find('arxiv:doi', ns)
+            
+            # Extract authors
+            authors = [author.find('atom:name', ns).text for author in entry.findall('atom:author', ns)]
+            
+            # Check publication year
+            published_year = datetime.strptime(published, "%Y-%m-%dT%H:%M:%SZ").year
+            
+            if start_year <= published_year <= end_year:
+                article = Article(
+                    title=title,
+                    authors=authors,
+                    abstract=summary,
+                    published=published,
+                    url=url,
+                    source='ArXiv',
+                    doi=(doi_elem.text or '').strip() if doi_elem is not None else '',
+                    arxiv_id=parse_arxiv_id(url)
+                )
+                articles.append(article)
+                logger.debug(f"Added article: {title}")
+        except Exception as e:
+            logger.error(f"Error processing article: {e}")
+    return articles, entry_count
+
+def search_pubmed_articles(query, date_range, max_results=DEFAULT_MAX_RESULTS['pubmed']):
     """
     Searches for articles on PubMed based on the query and date range.
     Returns formatted articles suitable for vector store creation.
     """
+    articles = []
+    for page in iter_pubmed_pages(query, date_range, max_results=max_results, page_size=max_results):
+        articles.extend(page)
+
+    if not articles:
+        logger.warning("No articles could be processed from PubMed")
+    else:
+        logger.info(f"Successfully processed {len(articles)} articles from PubMed")
+
+    return articles
+
+def iter_pubmed_pages(query, date_range, max_results=200, page_size=100):
+    """
+    Yield PubMed articles in efetch batches of page_size IDs.
+    The esearch result set is kept on the NCBI history server (WebEnv) and
+    fetched with retstart/retmax, so IDs are never sent back in the URL.
+    """
     start_year, end_year = date_range
     pubmed_api_key = os.getenv("PUBMED_API_KEY")
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+    base_url = PUBMED_API_URL
     
     if not pubmed_api_key:
         raise ValueError("PUBMED_API_KEY not found in environment variables")
@@ -115,136 +429,163 @@ def search_pubmed_articles(query, date_range):
 
         logger.info(f"Formatted PubMed query: {formatted_query}")
 
-        # Step 1: Get article IDs using esearch
+        # Step 1: Store matching IDs on the history server using esearch
         search_params = {
             "db": "pubmed",
             "term": formatted_query,
             "api_key": pubmed_api_key,
-            "retmax": 20,  # Limit results for testing
+            "retmax": 0,
+            "usehistory": "y",
             "retmode": "json"
         }
 
         search_url = f"{base_url}/esearch.fcgi"
-        search_response = requests.get(search_url, params=search_params)
-        search_response.raise_for_status()
-
-        search_data = search_response.json()
-    
-        # logger.debug(f"PubMed Search Response: {search_data}")
-
-        id_list = search_data.get('esearchresult', {}).get('idlist', [])
+        _record_upstream_call('PubMed')
+        with span("fetch", source='PubMed', endpoint='esearch') as fetch_span:
+            search_response = http_get(search_url, params=search_params, source='PubMed')
+            search_response.raise_for_status()
+            fetch_span.add("bytes", response_bytes(search_response))
+
+        search_result = search_response.json().get('esearchresult', {})
+        total = min(int(search_result.get('count', 0)), max_results)
         
-        if not id_list:
+        if not total:
             logger.warning(f"No results found for query: {formatted_query}")
-            return []
-
-        # Step 2: Fetch article details using efetch
-        fetch_params = {
-            "db": "pubmed",
-            "id": ",".join(id_list),
-            "api_key": pubmed_api_key,
-            "retmode": "xml"
-        }
+            return
 
+        # Step 2: Fetch article details in batches using efetch
         fetch_url = f"{base_url}/efetch.fcgi"
-        fetch_response = requests.get(fetch_url, params=fetch_params)
-        fetch_response.raise_for_status()
-
-        try:
-            root = ET.fromstring(fetch_response.content)
-        except ET.ParseError as e:
-            logger.error(f"Failed to parse PubMed XML response: {e}")
-            return []
-
-        articles = []
-
-        for article in root.findall(".//PubmedArticle"):
-            try:
-                article_data = {}
-
-                # Get title
-                title_elem = article.find(".//ArticleTitle")
-                article_data['title'] = title_elem.text if title_elem is not None else "No title available"
-
-                # Get abstract
-                abstract_texts = article.findall(".//Abstract/AbstractText")
-                if abstract_texts:
-                    abstract_parts = [
-                        (abstract_elem.get('Label', '') + ": " if abstract_elem.get('Label') else '') + (abstract_elem.text or '')
-                        for abstract_elem in abstract_texts
-                    ]
-                    article_data['abstract'] = ' '.join(abstract_parts)
-                else:
-                    article_data['abstract'] = "No abstract available"
-
-                # Get authors
-                authors = []
-                author_list = article.findall(".//Author")
-                for author in author_list:
-                    lastname = author.find(".//LastName")
-                    firstname = author.find(".//ForeName")
-                    if lastname is not None:
-                        author_name = lastname.text if firstname is None else f"{firstname.text} {lastname.text}"
-                        authors.append(author_name)
-
-                article_data['authors'] = authors if authors else ["Unknown Author"]
-
-                # Get publication date
-                pub_date = article.find(".//PubDate")
-                if pub_date is not None:
-                    year = pub_date.find(".//Year")
-                    if year is not None:
-                        article_data['published'] = year.text
-                    else:
-                        article_data['published'] = "N/A"
-
-                # Get PMID and URL
-                pmid_elem = article.find(".//PMID")
-                if pmid_elem is not None:
-                    article_data['pmid'] = pmid_elem.text
-                    article_data['url'] = f"https://pubmed.ncbi.nlm.nih.gov/{pmid_elem.text}/"
-
-                # Format content for vector store
-                article_data['content'] = f"Title: {article_data['title']}\nAuthors: {', '.join(article_data['authors'])}\nAbstract: {article_data['abstract']}\nURL: {article_data.get('url', 'No URL available')}"
-
-                # Metadata for vector store
-                article_data['metadata'] = {
-                    'source': 'PubMed',
-                    'title': article_data['title'],
-                    'authors': ', '.join(article_data['authors']),
-                    'url': article_data.get('url', ''),
-                    'pmid': article_data.get('pmid', ''),
-                    'published': article_data.get('published', 'N/A')
-                }
-
-                articles.append(article_data)
-
-            except Exception as e:
-                logger.error(f"Error processing PubMed article: {e}")
-                continue
-
-        if not articles:
-            logger.warning("No articles could be processed from PubMed")
-        else:
-            logger.info(f"Successfully processed {len(articles)} articles from PubMed")
-
-        return articles
+        for retstart in range(0, total, page_size):
+            fetch_params = {
+                "db": "pubmed",
+                "WebEnv": search_result.get('webenv'),
+                "query_key": search_result.get('querykey'),
+                "retstart": retstart,
+                "retmax": min(page_size, total - retstart),
+                "api_key": pubmed_api_key,
+                "retmode": "xml"
+            }
+
+            _record_upstream_call('PubMed')
+            with span("fetch", source='PubMed', endpoint='efetch') as fetch_span, \
+                    http_get(fetch_url, params=fetch_params, source='PubMed', stream=True) as fetch_response:
+                fetch_response.raise_for_status()
+
+                try:
+                    with span("parse", source='PubMed') as parse_span:
+                        articles = _parse_pubmed_articles(_response_stream(fetch_response))
+                        parse_span.add("items", len(articles))
+                except ET.ParseError as e:
+                    logger.error(f"Failed to parse PubMed XML response: {e}")
+                    return
+                finally:
+                    fetch_span.add("bytes", response_bytes(fetch_response))
+
+            if articles:
+                yield articles
 
     except requests.RequestException as e:
         logger.error(f"Error retrieving data from PubMed: {e}")
-        return []
+        raise SourceUnavailableError('PubMed', str(e)) from e
+    except SourceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in PubMed search: {e}")
-        return []
 
-def search_openaire_articles(query, date_range):
+def _parse_pubmed_articles(source):
+    """
+    Stream-parse a PubMed efetch XML payload into Articles.
+    Each PubmedArticle is read through direct child paths and then discarded.
+    """
+    articles = []
+
+    for article in _iter_xml_elements(source, 'PubmedArticle'):
+        try:
+            citation = article.find("MedlineCitation")
+            article_elem = citation.find("Article")
+
+            # Get title
+            title_elem = article_elem.find("ArticleTitle")
+            title = title_elem.text if title_elem is not None else "No title available"
+
+            # Get abstract
+            abstract_texts = article_elem.findall("Abstract/AbstractText")
+            if abstract_texts:
+                abstract_parts = [
+                    (abstract_elem.get('Label', '') + ": " if abstract_elem.get('Label') else '') + (abstract_elem.text or '')
+                    for abstract_elem in abstract_texts
+                ]
+                abstract = ' '.join(abstract_parts)
+            else:
+                abstract = "No abstract available"
+
+            # Get authors
+            authors = []
+            author_list = article_elem.findall("AuthorList/Author")
+            for author in author_list:
+                lastname = author.find("LastName")
+                firstname = author.find("ForeName")
+                if lastname is not None:
+                    author_name = lastname.text if firstname is None else f"{firstname.text} {lastname.text}"
+                    authors.append(author_name)
+
+            # Get publication date
+            published = "N/A"
+            year = article_elem.find("Journal/JournalIssue/PubDate/Year")
+            if year is not None:
+                published = year.text
+
+            # Get PMID and URL
+            pmid = ''
+            url = ''
+            pmid_elem = citation.find("PMID")
+            if pmid_elem is not None:
+                pmid = pmid_elem.text
+                url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+
+            # Get DOI, falling back to the electronic location when the
+            # article id list has none
+            doi_elem = article.find("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+            if doi_elem is None:
+                doi_elem = article_elem.find("ELocationID[@EIdType='doi']")
+            doi = (doi_elem.text or '').strip() if doi_elem is not None else ''
+
+            articles.append(Article(
+                title=title,
+                authors=authors or ["Unknown Author"],
+                abstract=abstract,
+                published=published,
+                url=url,
+                source='PubMed',
+                doi=doi,
+                pmid=pmid
+            ))
+
+        except Exception as e:
+            logger.error(f"Error processing PubMed article: {e}")
+            continue
+
+    return articles
+
+def search_openaire_articles(query, date_range, max_results=DEFAULT_MAX_RESULTS['openaire']):
     """
     Searches for articles on OpenAIRE based on the query and date range.
     Returns formatted articles suitable for vector store creation.
     """
+    articles = []
+    for page in iter_openaire_pages(query, date_range, max_results=max_results, page_size=max_results):
+        articles.extend(page)
+
+    logger.info(f"Successfully processed {len(articles)} articles from OpenAIRE")
+    return articles
+
+def iter_openaire_pages(query, date_range, max_results=100, page_size=50):
+    """
+    Yield OpenAIRE articles page by page, driving the API's page parameter
+    """
     try:
         logger.info(f"Searching OpenAIRE for: {query}")
-        base_url = "https://api.openaire.eu/search/publications"
+        base_url = OPENAIRE_API_URL
         
         # Format date range for OpenAIRE API
         start_year, end_year = date_range
@@ -258,7 +599,7 @@ def search_openaire_articles(query, date_range):
         params = {
             'keywords': keywords,
             'format': 'json',
-            'size': 10
+            'size': page_size
         }
         
         # Only add date parameters if they're within a reasonable range
@@ -267,162 +608,198 @@ def search_openaire_articles(query, date_range):
         if int(end_year) <= 2025:
             params['toDateAccepted'] = to_date
         
-        logger.info(f"Making request to OpenAIRE with URL: {base_url}")
-        logger.info(f"Request parameters: {params}")
-        
-        response = requests.get(base_url, params=params)
-        
-        # Log the actual URL being called for debugging
-        logger.info(f"Full URL being called: {response.url}")
-        
-        response.raise_for_status()
-        
-        data = response.json()
-        logger.info(f"Response status code: {response.status_code}")
-        logger.info(f"Response data type: {type(data)}")
-        logger.info(f"Response data keys: {data.keys() if isinstance(data, dict) else 'Not a dictionary'}")
-        
-        articles = []
-        
-        # Check if we have a valid response structure
-        if isinstance(data, dict) and 'response' in data:
-            response_data = data['response']
-            if 'results' in response_data:
-                results = response_data['results']
-                if isinstance(results, dict) and 'result' in results:
-                    results_list = results['result']
-                    if not isinstance(results_list, list):
-                        results_list = [results_list]
-                    
-                    logger.info(f"Number of results found: {len(results_list)}")
-                    
-                    for result in results_list:
-                        try:
-                            if not isinstance(result, dict):
-                                continue
-                            
-                            metadata = result.get('metadata', {})
-                            if not metadata:
-                                continue
-                                
-                            oaf_entity = metadata.get('oaf:entity', {})
-                            if not oaf_entity:
-                                continue
-                                
-                            oaf_result = oaf_entity.get('oaf:result', {})
-                            if not oaf_result:
-                                continue
-                            
-                            # Extract title
-                            title = ''
-                            title_data = oaf_result.get('title', [])
-                            if title_data and isinstance(title_data, list):
-                                title = title_data[0].get('$', '') if isinstance(title_data[0], dict) else str(title_data[0])
-                            
-                            # Extract abstract
-                            abstract = ''
-                            description_data = oaf_result.get('description', [])
-                            if description_data and isinstance(description_data, list):
-                                abstract = description_data[0].get('$', '') if isinstance(description_data[0], dict) else str(description_data[0])
-                            
-                            # Extract authors
-                            authors = []
-                            creator_data = oaf_result.get('creator', [])
-                            if creator_data and isinstance(creator_data, list):
-                                for creator in creator_data:
-                                    if isinstance(creator, dict):
-                                        author_name = creator.get('$', '')
-                                        if author_name:
-                                            authors.append(author_name)
-                            
-                            # Extract DOI
-                            doi = ''
-                            pid_data = oaf_result.get('pid', [])
-                            if pid_data and isinstance(pid_data, list):
-                                for pid in pid_data:
-                                    if isinstance(pid, dict) and pid.get('@classid') == 'doi':
-                                        doi = pid.get('$', '')
-                                        break
-                            
-                            # Extract publication date (try multiple fields)
-                            pub_date = ''
-                            for date_field in ['dateofacceptance', 'publicationdate', 'year']:
-                                date_data = oaf_result.get(date_field, [])
-                                if date_data:
-                                    if isinstance(date_data, list):
-                                        date_value = date_data[0].get('$', '') if isinstance(date_data[0], dict) else str(date_data[0])
-                                    else:
-                                        date_value = str(date_data)
-                                    
-                                    # If date is a string representation of a dict, try to parse it
-                                    if isinstance(date_value, str) and date_value.startswith('{'):
-                                        try:
-                                            import ast
-                                            date_dict = ast.literal_eval(date_value)
-                                            date_value = date_dict.get('$', '')
-                                        except:
-                                            pass
-                                    
-                                    if date_value:
-                                        pub_date = date_value
-                                        break
-                            
-                            # Extract journal information
-                            journal = ''
-                            journal_data = oaf_result.get('journal', [])
-                            if journal_data and isinstance(journal_data, list):
-                                journal = journal_data[0].get('$', '') if isinstance(journal_data[0], dict) else str(journal_data[0])
-                            
-                            # Extract volume and issue
-                            volume = ''
-                            volume_data = oaf_result.get('volume', [])
-                            if volume_data and isinstance(volume_data, list):
-                                volume = volume_data[0].get('$', '') if isinstance(volume_data[0], dict) else str(volume_data[0])
-                            
-                            issue = ''
-                            issue_data = oaf_result.get('issue', [])
-                            if issue_data and isinstance(issue_data, list):
-                                issue = issue_data[0].get('$', '') if isinstance(issue_data[0], dict) else str(issue_data[0])
-                            
-                            # Extract pages
-                            pages = ''
-                            pages_data = oaf_result.get('pages', [])
-                            if pages_data and isinstance(pages_data, list):
-                                pages = pages_data[0].get('$', '') if isinstance(pages_data[0], dict) else str(pages_data[0])
-                            
-                            article = {
-                                'title': title.strip(),
-                                'authors': [author.strip() for author in authors if author.strip()],
-                                'abstract': abstract.strip(),
-                                'doi': doi.strip(),
-                                'publication_date': str(pub_date).strip(),
-                                'journal': journal.strip(),
-                                'volume': volume.strip(),
-                                'issue': issue.strip(),
-                                'pages': pages.strip(),
-                                'source': 'OpenAIRE'
-                            }
-                            
-                            # Only add articles that have at least a title or abstract
-                            if article['title'] or article['abstract']:
-                                articles.append(article)
-                        
-                        except Exception as e:
-                            logger.warning(f"Error processing individual result: {str(e)}")
-                            continue
-        
-        logger.info(f"Successfully processed {len(articles)} articles from OpenAIRE")
-        return articles
+        fetched = 0
+        page = 1
+        while fetched < max_results:
+            params['page'] = page
+            logger.info(f"Making request to OpenAIRE with URL: {base_url}")
+            logger.info(f"Request parameters: {params}")
+            
+            _record_upstream_call('OpenAIRE')
+            with span("fetch", source='OpenAIRE') as fetch_span:
+                response = http_get(base_url, params=params, source='OpenAIRE')
+                fetch_span.add("bytes", response_bytes(response))
+            
+            # Log the actual URL being called for debugging
+            logger.info(f"Full URL being called: {response.url}")
+            
+            response.raise_for_status()
+            
+            with span("parse", source='OpenAIRE') as parse_span:
+                data = response.json()
+                logger.info(f"Response status code: {response.status_code}")
+                
+                results_list = _openaire_results_list(data)
+                logger.info(f"Number of results found: {len(results_list)}")
+
+                # The last page may hold more results than we still need
+                results_list = results_list[:max_results - fetched]
+                articles = []
+                for result in results_list:
+                    try:
+                        article = _parse_openaire_result(result)
+                        if article is not None:
+                            articles.append(article)
+                    except Exception as e:
+                        logger.warning(f"Error processing individual result: {str(e)}")
+                        continue
+                parse_span.add("items", len(articles))
+
+            if articles:
+                yield articles
+            if len(results_list) < page_size:
+                return
+            fetched += len(results_list)
+            page += 1
         
     except requests.RequestException as e:
         logger.error(f"Error retrieving data from OpenAIRE: {str(e)}")
-        return []
+        raise SourceUnavailableError('OpenAIRE', str(e)) from e
+    except SourceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in OpenAIRE search: {str(e)}")
         logger.error(f"Error details: {str(e)}")
         import traceback
         logger.error(f"Traceback: {traceback.format_exc()}")
-        return []
+
+def _openaire_results_list(data):
+    """
+    Extract the list of raw results from an OpenAIRE JSON response
+    """
+    # Check if we have a valid response structure
+    if isinstance(data, dict) and 'response' in data:
+        response_data = data['response']
+        if 'results' in response_data:
+            results = response_data['results']
+            if isinstance(results, dict) and 'result' in results:
+                results_list = results['result']
+                if not isinstance(results_list, list):
+                    results_list = [results_list]
+                return results_list
+    return []
+
+def _parse_openaire_result(result):
+    """
+    Convert one raw OpenAIRE result into an Article, or None to skip it
+    """
+    if not isinstance(result, dict):
+        return None
+
+    metadata = result.get('metadata', {})
+    if not metadata:
+        return None
+
+    oaf_entity = metadata.get('oaf:entity', {})
+    if not oaf_entity:
+        return None
+
+    oaf_result = oaf_entity.get('oaf:result', {})
+    if not oaf_result:
+        return None
+
+    # Extract title
+    title = ''
+    title_data = oaf_result.get('title', [])
+    if title_data and isinstance(title_data, list):
+        title = title_data[0].get('$', '') if isinstance(title_data[0], dict) else str(title_data[0])
+
+    # Extract abstract
+    abstract = ''
+    description_data = oaf_result.get('description', [])
+    if description_data and isinstance(description_data, list):
+        abstract = description_data[0].get('$', '') if isinstance(description_data[0], dict) else str(description_data[0])
+
+    # Extract authors
+    authors = []
+    creator_data = oaf_result.get('creator', [])
+    if creator_data and isinstance(creator_data, list):
+        for creator in creator_data:
+            if isinstance(creator, dict):
+                author_name = creator.get('$', '')
+                if author_name:
+                    authors.append(author_name)
+
+    # Extract DOI
+    doi = ''
+    pid_data = oaf_result.get('pid', [])
+    if pid_data and isinstance(pid_data, list):
+        for pid in pid_data:
+            if isinstance(pid, dict) and pid.get('@classid') == 'doi':
+                doi = pid.get('$', '')
+                break
+
+    # Extract publication date (try multiple fields)
+    pub_date = ''
+    for date_field in ['dateofacceptance', 'publicationdate', 'year']:
+        date_data = oaf_result.get(date_field, [])
+        if date_data:
+            if isinstance(date_data, list):
+                date_value = date_data[0].get('$', '') if isinstance(date_data[0], dict) else str(date_data[0])
+            else:
+                date_value = str(date_data)
+
+            # If date is a string representation of a dict, try to parse it
+            if isinstance(date_value, str) and date_value.startswith('{'):
+                try:
+                    import ast
+                    date_dict = ast.literal_eval(date_value)
+                    date_value = date_dict.get('$', '')
+                except:
+                    pass
+
+            if date_value:
+                pub_date = date_value
+                break
+
+    # Extract journal information
+    journal = ''
+    journal_data = oaf_result.get('journal', [])
+    if journal_data and isinstance(journal_data, list):
+        journal = journal_data[0].get('$', '') if isinstance(journal_data[0], dict) else str(journal_data[0])
+
+    # Extract volume and issue
+    volume = ''
+    volume_data = oaf_result.get('volume', [])
+    if volume_data and isinstance(volume_data, list):
+        volume = volume_data[0].get('$', '') if isinstance(volume_data[0], dict) else str(volume_data[0])
+
+    issue = ''
+    issue_data = oaf_result.get('issue', [])
+    if issue_data and isinstance(issue_data, list):
+        issue = issue_data[0].get('$', '') if isinstance(issue_data[0], dict) else str(issue_data[0])
+
+    # Extract pages
+    pages = ''
+    pages_data = oaf_result.get('pages', [])
+    if pages_data and isinstance(pages_data, list):
+        pages = pages_data[0].get('$', '') if isinstance(pages_data[0], dict) else str(pages_data[0])
+
+    doi = doi.strip()
+    article = Article(
+        title=title.strip(),
+        authors=[author.strip() for author in authors if author.strip()],
+        abstract=abstract.strip(),
+        published=str(pub_date).strip(),
+        url=f"https://doi.org/{doi}" if doi else '',
+        source='OpenAIRE',
+        doi=doi,
+        journal=journal.strip(),
+        volume=volume.strip(),
+        issue=issue.strip(),
+        pages=pages.strip()
+    )
+
+    # Only keep articles that have at least a title or abstract
+    if article.title or article.abstract:
+        return article
+    return None
+
+SOURCE_PAGE_ITERATORS = {
+    'arxiv': iter_arxiv_pages,
+    'pubmed': iter_pubmed_pages,
+    'openaire': iter_openaire_pages
+}
 
 #would you be able to add a search function on openaire OPENAIRE_API_KEY is the env variable
 
@@ -0,0 +1,390 @@
+# trace_functions.py
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Spans are only recorded when tracing is enabled; otherwise span() hands
+# out a shared no-op span and nothing is timed or stored
+TRACING_ENABLED = os.getenv("LITSCOUT_TRACING", "0") != "0"
+
+# Finished traces kept in memory for the debug panel and exports
+TRACE_MAX_TRACES = int(os.getenv("LITSCOUT_TRACE_MAX_TRACES", "100"))
+
+# Optional file each finished trace is appended to, one OTLP/JSON line per trace
+TRACE_FILE = os.getenv("LITSCOUT_TRACE_FILE")
+
+SERVICE_NAME = "litscout"
+
+# Upper bounds of the Prometheus duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Counters shown as columns in the per-report breakdown, in this order
+BREAKDOWN_COUNTERS = ("bytes", "items", "tokens_in", "tokens_out", "cache_hits", "cache_misses")
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_NON_METRIC_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+class Span:
+    """
+    One timed operation within a trace.
+    Counters (bytes, items, tokens_in, tokens_out, cache_hits, ...) are
+    summed per span name into metrics; attributes only describe the span.
+    """
+
+    recording = True
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.counters = {}
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.seconds = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, counter, amount=1):
+        # Worker threads may add to the span of the stage that started them
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def end(self, error=None):
+        """
+        Finish the span and hand it to the tracer; later calls are ignored
+        """
+        with self._lock:
+            if self.seconds is not None:
+                return
+            self.seconds = time.perf_counter() - self._started
+            if error is not None:
+                self.error = str(error) or type(error).__name__
+        get_tracer().record(self)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'seconds': self.seconds,
+            'attributes': dict(self.attributes),
+            'counters': dict(self.counters),
+            'error': self.error
+        }
+
+class _NoopSpan:
+    """
+    Stand-in returned while tracing is disabled
+    """
+
+    recording = False
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, counter, amount=1):
+        pass
+
+    def end(self, error=None):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class _SpanScope:
+    __slots__ = ('name', 'attributes', 'span', 'token')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = Span(self.name, _current_span.get(), self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self.token)
+        self.span.end(exc)
+        return False
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return _NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SCOPE = _NoopScope()
+
+def span(name, **attributes):
+    """
+    Context manager timing the block as a child of the current span.
+    Yields the span so the block can add counters; errors raised in the
+    block are recorded on the span and propagate.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP_SCOPE
+    return _SpanScope(name, attributes)
+
+def start_span(name, **attributes):
+    """
+    Start a child of the current span without making it current, for work
+    that cannot sit inside a with block (generators); call end() when done
+    """
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, _current_span.get(), attributes)
+
+class _UseScope:
+    __slots__ = ('span', 'token')
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self.token)
+        return False
+
+def use_span(started_span):
+    """
+    Context manager making a span from start_span() current within the block,
+    e.g. in worker threads, without ending it
+    """
+    if not started_span.recording:
+        return _NOOP_SCOPE
+    return _UseScope(started_span)
+
+def current_span():
+    """
+    The innermost active span, or a no-op span outside any span
+    """
+    return _current_span.get() or _NOOP_SPAN
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Cache stats exported by cache_prometheus_text: (stats field, metric type, help text)
+CACHE_METRICS = (
+    ('hits', 'counter', 'Cache lookups answered from fresh entries'),
+    ('stale_hits', 'counter', 'Cache lookups answered from stale entries'),
+    ('misses', 'counter', 'Cache lookups that found no usable entry'),
+    ('entries', 'gauge', 'Entries currently held in the cache'),
+)
+
+def cache_prometheus_text(stats):
+    """
+    Cache stats, keyed by cache name, in the Prometheus text exposition format
+    """
+    lines = []
+    for field, kind, help_text in CACHE_METRICS:
+        family = f"litscout_cache_{field}_total" if kind == 'counter' else f"litscout_cache_{field}"
+        samples = [(name, values[field]) for name, values in sorted(stats.items()) if field in values]
+        if not samples:
+            continue
+        lines += [f"# HELP {family} {help_text}", f"# TYPE {family} {kind}"]
+        lines += [f'{family}{{cache="{_escape_label(name)}"}} {value}' for name, value in samples]
+    return "\n".join(lines) + "\n" if lines else ""
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def _otel_span(data):
+    attributes = dict(data['attributes'], **data['counters'])
+    otel = {
+        'traceId': data['trace_id'],
+        'spanId': data['span_id'],
+        'name': data['name'],
+        'kind': 1,
+        'startTimeUnixNano': str(data['start_ns']),
+        'endTimeUnixNano': str(data['start_ns'] + int(data['seconds'] * 1e9)),
+        'attributes': [{'key': key, 'value': _otel_value(value)} for key, value in attributes.items()],
+        'status': {'code': 2, 'message': data['error']} if data['error'] else {'code': 0}
+    }
+    if data['parent_id']:
+        otel['parentSpanId'] = data['parent_id']
+    return otel
+
+class Tracer:
+    """
+    Collects finished spans. Keeps the most recent traces for per-report
+    breakdowns and aggregates per-span-name metrics for Prometheus.
+    """
+
+    def __init__(self, max_traces=TRACE_MAX_TRACES, trace_file=TRACE_FILE):
+        self.max_traces = max_traces
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+        self._metrics = {}
+
+    def record(self, span):
+        data = span.to_dict()
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(data)
+
+            metric = self._metrics.get(span.name)
+            if metric is None:
+                metric = self._metrics[span.name] = {
+                    'count': 0, 'seconds': 0.0, 'errors': 0,
+                    'buckets': [0] * len(DURATION_BUCKETS), 'counters': {}
+                }
+            metric['count'] += 1
+            metric['seconds'] += span.seconds
+            metric['errors'] += span.error is not None
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.seconds <= bound:
+                    metric['buckets'][i] += 1
+            for counter, amount in data['counters'].items():
+                metric['counters'][counter] = metric['counters'].get(counter, 0) + amount
+
+        if self.trace_file and span.parent_id is None:
+            self._append_trace(span.trace_id)
+
+    def _append_trace(self, trace_id):
+        try:
+            with open(self.trace_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.otel_json([trace_id])) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write trace to {self.trace_file}: {e}")
+
+    def trace(self, trace_id):
+        """
+        Finished spans of a trace, oldest first, or [] if it is unknown
+        """
+        with self._lock:
+            return sorted(self._traces.get(trace_id, ()), key=lambda data: data['start_ns'])
+
+    def trace_ids(self):
+        with self._lock:
+            return list(self._traces)
+
+    def breakdown(self, trace_id):
+        """
+        One row per span of a trace in tree order, with its depth, wall time
+        and BREAKDOWN_COUNTERS; for the per-report debug panel
+        """
+        spans = self.trace(trace_id)
+        span_ids = {data['span_id'] for data in spans}
+        children = {}
+        for data in spans:
+            parent = data['parent_id'] if data['parent_id'] in span_ids else None
+            children.setdefault(parent, []).append(data)
+
+        rows = []
+        def visit(parent, depth):
+            for data in children.get(parent, ()):
+                row = {'span': data['name'], 'depth': depth, 'seconds': data['seconds']}
+                row.update({counter: data['counters'].get(counter, 0) for counter in BREAKDOWN_COUNTERS})
+                row['error'] = data['error'] or ''
+                rows.append(row)
+                visit(data['span_id'], depth + 1)
+        visit(None, 0)
+        return rows
+
+    def prometheus_text(self):
+        """
+        Span metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = {name: dict(metric, counters=dict(metric['counters'])) for name, metric in self._metrics.items()}
+
+        lines = [
+            "# HELP litscout_span_duration_seconds Wall time of traced operations",
+            "# TYPE litscout_span_duration_seconds histogram",
+        ]
+        for name, metric in sorted(metrics.items()):
+            label = f'span="{_escape_label(name)}"'
+            for bound, count in zip(DURATION_BUCKETS, metric['buckets']):
+                lines.append(f'litscout_span_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'litscout_span_duration_seconds_bucket{{{label},le="+Inf"}} {metric["count"]}')
+            lines.append(f'litscout_span_duration_seconds_sum{{{label}}} {metric["seconds"]}')
+            lines.append(f'litscout_span_duration_seconds_count{{{label}}} {metric["count"]}')
+
+        lines += [
+            "# HELP litscout_span_errors_total Traced operations that raised an error",
+            "# TYPE litscout_span_errors_total counter",
+        ]
+        lines += [
+            f'litscout_span_errors_total{{span="{_escape_label(name)}"}} {metric["errors"]}'
+            for name, metric in sorted(metrics.items())
+        ]
+
+        counters = sorted({counter for metric in metrics.values() for counter in metric['counters']})
+        for counter in counters:
+            family = f"litscout_span_{_NON_METRIC_CHARS.sub('_', counter)}_total"
+            lines += [f"# HELP {family} Total {counter} recorded by traced operations", f"# TYPE {family} counter"]
+            lines += [
+                f'{family}{{span="{_escape_label(name)}"}} {metric["counters"][counter]}'
+                for name, metric in sorted(metrics.items()) if counter in metric['counters']
+            ]
+        return "\n".join(lines) + "\n"
+
+    def otel_json(self, trace_ids=None):
+        """
+        Traces (all kept traces by default) as an OTLP/JSON export request
+        """
+        spans = [
+            _otel_span(data)
+            for trace_id in (self.trace_ids() if trace_ids is None else trace_ids)
+            for data in self.trace(trace_id)
+        ]
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+                'scopeSpans': [{'scope': {'name': SERVICE_NAME}, 'spans': spans}]
+            }]
+        }
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+            self._metrics.clear()
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """
+    Return the process-wide tracer
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
@@ -0,0 +1,322 @@
+# vector_store_functions.py
+
+import os
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from cache_functions import CACHE_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Vector store backend: "pinecone" (remote), "numpy" (in-process brute force),
+# "chroma" (persisted local HNSW index) or "local" (numpy for small document
+# sets, chroma for large ones)
+VECTOR_STORE_BACKEND = os.getenv("LITSCOUT_VECTOR_STORE", "pinecone").lower()
+
+# Above this many chunks the "local" backend switches from numpy to chroma
+NUMPY_MAX_DOCUMENTS = int(os.getenv("LITSCOUT_NUMPY_MAX_DOCUMENTS", "20000"))
+
+CHROMA_DIR = os.getenv(
+    "LITSCOUT_CHROMA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chroma_db")
+)
+
+# Report namespaces unused for this long are deleted by the garbage collector,
+# which runs at most once per NAMESPACE_GC_INTERVAL seconds
+NAMESPACE_TTL = float(os.getenv("LITSCOUT_NAMESPACE_TTL", str(7 * 24 * 3600)))
+NAMESPACE_GC_INTERVAL = float(os.getenv("LITSCOUT_NAMESPACE_GC_INTERVAL", "3600"))
+
+def make_namespace(report_id):
+    """
+    Fresh namespace for one indexing run of a report. Namespaces are never
+    shared, so concurrent reports with the same inputs cannot overwrite or
+    delete each other's chunks, and a retried run never sees the chunks of
+    an earlier attempt; unused namespaces are left to the garbage collector.
+    """
+    return f"report-{report_id}-{uuid.uuid4().hex[:8]}"
+
+def document_id(document):
+    """
+    Content-derived vector ID, so repeated upserts of a chunk are idempotent
+    """
+    origin = document.metadata.get('url') or document.metadata.get('title', '')
+    return hashlib.sha256(f"{origin}\0{document.page_content}".encode("utf-8")).hexdigest()[:32]
+
+def unique_documents(documents):
+    """
+    Drop repeated chunks and return (documents, ids)
+    """
+    unique = {}
+    for doc in documents:
+        unique.setdefault(document_id(doc), doc)
+    return list(unique.values()), list(unique)
+
+class NamespaceRegistry:
+    """
+    Records when each vector store namespace was last used, so stale
+    namespaces can be found and deleted
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS namespaces ("
+            "namespace TEXT NOT NULL, backend TEXT NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (namespace, backend))"
+        )
+        self._conn.commit()
+
+    def touch(self, namespace, backend):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO namespaces (namespace, backend, last_used) VALUES (?, ?, ?)",
+                (namespace, backend, time.time())
+            )
+            self._conn.commit()
+
+    def stale(self, ttl=None):
+        """
+        (namespace, backend) pairs unused for longer than ttl seconds
+        """
+        ttl = NAMESPACE_TTL if ttl is None else ttl
+        with self._lock:
+            return self._conn.execute(
+                "SELECT namespace, backend FROM namespaces WHERE last_used < ?",
+                (time.time() - ttl,)
+            ).fetchall()
+
+    def remove(self, namespace, backend):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM namespaces WHERE namespace = ? AND backend = ?", (namespace, backend)
+            )
+            self._conn.commit()
+
+    def gc_due(self):
+        """
+        True at most once per NAMESPACE_GC_INTERVAL
+        """
+        with self._lock:
+            now = time.time()
+            if now - self._last_gc < NAMESPACE_GC_INTERVAL:
+                return False
+            self._last_gc = now
+            return True
+
+_namespace_registry = None
+_namespace_registry_lock = threading.Lock()
+
+def get_namespace_registry():
+    global _namespace_registry
+    with _namespace_registry_lock:
+        if _namespace_registry is None:
+            _namespace_registry = NamespaceRegistry(os.path.join(CACHE_DIR, "namespaces.sqlite3"))
+        return _namespace_registry
+
+def collect_stale_namespaces(delete_namespace, ttl=None):
+    """
+    Delete namespaces unused for longer than ttl.
+    delete_namespace(namespace, backend) removes the vectors; namespaces
+    whose deletion fails stay registered and are retried on the next run.
+    """
+    registry = get_namespace_registry()
+    removed = 0
+    for namespace, backend in registry.stale(ttl):
+        try:
+            delete_namespace(namespace, backend)
+        except Exception as e:
+            logger.warning(f"Failed to delete stale namespace {namespace} ({backend}): {e}")
+            continue
+        registry.remove(namespace, backend)
+        removed += 1
+    if removed:
+        logger.info(f"Deleted {removed} stale vector store namespaces")
+    return removed
+
+class NumpyVectorStore:
+    """
+    In-process vector store doing exact cosine search with one matrix
+    multiply over a float32 matrix of normalized vectors.
+    Exposes the same search methods as the LangChain stores used elsewhere.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.ids = []
+        self.documents = []
+        # Rows beyond len(self.ids) are spare capacity; the matrix grows
+        # geometrically so pipelined batches are not copied on every add
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_documents(self, documents, ids=None):
+        """
+        Embed and add documents, returning their IDs
+        """
+        documents = list(documents)
+        if not documents:
+            return []
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        return self.add_vectors(vectors, documents, ids)
+
+    def add_vectors(self, vectors, documents, ids=None):
+        """
+        Add pre-computed vectors. Re-adding an existing ID replaces it.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if ids is None:
+            ids = [str(len(self.ids) + i) for i in range(len(documents))]
+
+        with self._lock:
+            if not len(self.documents):
+                self._matrix = np.empty((0, vectors.shape[1]), dtype=np.float32)
+            new_rows = []
+            for vector, doc, doc_id in zip(vectors, documents, ids):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    self._positions[doc_id] = len(self.ids) + len(new_rows)
+                    new_rows.append((vector, doc, doc_id))
+                elif position >= len(self.ids):
+                    new_rows[position - len(self.ids)] = (vector, doc, doc_id)
+                else:
+                    self._matrix[position] = vector
+                    self.documents[position] = doc
+            if new_rows:
+                size = len(self.ids)
+                self._reserve(size + len(new_rows), vectors.shape[1])
+                self._matrix[size:size + len(new_rows)] = np.stack([row[0] for row in new_rows])
+                self.documents.extend(row[1] for row in new_rows)
+                self.ids.extend(row[2] for row in new_rows)
+        return list(ids)
+
+    def _reserve(self, rows, dimension):
+        """
+        Grow the matrix to hold at least rows vectors, doubling its capacity
+        """
+        capacity = len(self._matrix)
+        if rows <= capacity:
+            return
+        matrix = np.empty((max(rows, capacity * 2, 64), dimension), dtype=np.float32)
+        matrix[:len(self.ids)] = self._matrix[:len(self.ids)]
+        self._matrix = matrix
+
+    def similarity_search_by_vector_with_score(self, vector, k=4):
+        with self._lock:
+            if not len(self.documents):
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1)
+            scores = self._matrix[:len(self.ids)] @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.documents[i], float(scores[i])) for i in top]
+
+    def similarity_search_with_score(self, query, k=4):
+        """
+        (document, cosine similarity) pairs, most similar first
+        """
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def similarity_search_with_relevance_scores(self, query, k=4):
+        # Map cosine similarity from [-1, 1] onto LangChain's [0, 1] relevance
+        return [(doc, (score + 1) / 2) for doc, score in self.similarity_search_with_score(query, k)]
+
+    def similarity_search(self, query, k=4):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+_CHROMA_REQUIRED = (
+    "The chroma vector store backend requires the chromadb package. "
+    "Install it with `pip install chromadb`."
+)
+CHROMA_COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+_chroma_client = None
+_chroma_client_lock = threading.Lock()
+
+def get_chroma_client():
+    """
+    Return the process-wide chromadb client persisting to CHROMA_DIR
+    """
+    global _chroma_client
+    with _chroma_client_lock:
+        if _chroma_client is None:
+            try:
+                import chromadb
+            except ImportError as e:
+                raise ImportError(_CHROMA_REQUIRED) from e
+            _chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+        return _chroma_client
+
+def _chroma_class():
+    try:
+        from langchain_community.vectorstores import Chroma
+    except ImportError as e:
+        raise ImportError(_CHROMA_REQUIRED) from e
+    return Chroma
+
+def create_chroma_store(documents, embeddings, collection_name, ids=None):
+    """
+    Add documents to a persisted Chroma (HNSW) collection under CHROMA_DIR
+    """
+    store = _chroma_class()(
+        client=get_chroma_client(),
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        collection_metadata=CHROMA_COLLECTION_METADATA
+    )
+    if documents:
+        store.add_documents(documents, ids=ids)
+    return store
+
+def delete_chroma_collection(collection_name):
+    get_chroma_client().delete_collection(collection_name)
+
+def resolve_backend(backend, document_count):
+    """
+    Concrete backend name for a configured backend and document count
+    """
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend == "local":
+        return "numpy" if document_count <= NUMPY_MAX_DOCUMENTS else "chroma"
+    return backend
+
+def open_local_vector_store(embeddings, backend, collection_name="litscout-articles"):
+    """
+    Empty numpy store or Chroma collection plus a write(vectors, documents, ids)
+    function that stores pre-computed vectors, for pipelined embedding
+    """
+    if backend == "numpy":
+        store = NumpyVectorStore(embeddings)
+        return store, store.add_vectors
+    if backend == "chroma":
+        store = create_chroma_store([], embeddings, collection_name)
+        collection = get_chroma_client().get_or_create_collection(
+            collection_name, metadata=CHROMA_COLLECTION_METADATA
+        )
+
+        def write(vectors, documents, ids):
+            # The LangChain wrapper only accepts texts to embed, so
+            # pre-computed vectors go to the collection through chromadb's API
+            collection.upsert(
+                ids=list(ids),
+                embeddings=[[float(x) for x in vector] for vector in vectors],
+                metadatas=[doc.metadata for doc in documents],
+                documents=[doc.page_content for doc in documents]
+            )
+        return store, write
+    raise ValueError(f"Unsupported local vector store backend: {backend}")
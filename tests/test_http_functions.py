@@ -0,0 +1,201 @@
+# test_http_functions.py
+
+import os
+import sys
+import time
+import threading
+import unittest
+from unittest import mock
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import http_functions
+import search_function
+from http_functions import (
+    BACKOFF_MAX, MAX_RETRIES, SOURCE_RATE_LIMITS, SourceUnavailableError,
+    configure_source, get_circuit_breaker, get_rate_limiter, http_get
+)
+
+ARXIV_FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "arxiv_atom.xml")
+
+class _ArxivStub(BaseHTTPRequestHandler):
+    """
+    Serves the recorded ArXiv feed for every request
+    """
+
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        with open(ARXIV_FIXTURE, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _ScriptedStub(BaseHTTPRequestHandler):
+    """
+    Answers with the scripted (status, headers) responses in order, repeating
+    the last one once the script runs out
+    """
+
+    script = [(200, {})]
+    requests = 0
+
+    def do_GET(self):
+        handler = type(self)
+        status, headers = handler.script[min(handler.requests, len(handler.script) - 1)]
+        handler.requests += 1
+        body = b"ok"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        _ScriptedStub.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ScriptedStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        configure_source("Stub")
+        # Backoff delays are recorded instead of slept
+        self.sleep = mock.patch.object(http_functions.time, "sleep").start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delays(self):
+        return [call.args[0] for call in self.sleep.call_args_list]
+
+    def test_retry_after_seconds(self):
+        _ScriptedStub.script = [(503, {"Retry-After": "2"}), (200, {})]
+        response = http_get(self.url, source="Stub")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_ScriptedStub.requests, 2)
+        self.assertEqual(self.delays(), [2.0])
+
+    def test_retry_after_http_date(self):
+        _ScriptedStub.script = [(429, {"Retry-After": formatdate(time.time() + 10, usegmt=True)}), (200, {})]
+        response = http_get(self.url, source="Stub")
+        self.assertEqual(response.status_code, 200)
+        (delay,) = self.delays()
+        self.assertTrue(8 <= delay <= 10, delay)
+
+    def test_retry_after_beyond_backoff_max_gives_up(self):
+        _ScriptedStub.script = [(429, {"Retry-After": str(int(BACKOFF_MAX) + 60)})]
+        with self.assertRaises(SourceUnavailableError):
+            http_get(self.url, source="Stub")
+        self.assertEqual(_ScriptedStub.requests, 1)
+        self.assertEqual(self.delays(), [])
+
+    def test_retries_exhausted(self):
+        for status in (500, 429):
+            _ScriptedStub.requests = 0
+            _ScriptedStub.script = [(status, {})]
+            configure_source("Stub")
+            with self.assertRaises(SourceUnavailableError) as raised:
+                http_get(self.url, source="Stub")
+            self.assertEqual(raised.exception.source, "Stub")
+            self.assertEqual(_ScriptedStub.requests, MAX_RETRIES + 1)
+
+    def test_client_error_is_not_retried(self):
+        _ScriptedStub.script = [(404, {})]
+        self.assertEqual(http_get(self.url, source="Stub").status_code, 404)
+        self.assertEqual(_ScriptedStub.requests, 1)
+
+    def test_circuit_opens_then_allows_one_trial(self):
+        configure_source("Stub", failure_threshold=1, reset_timeout=60)
+        _ScriptedStub.script = [(503, {})]
+        with self.assertRaises(SourceUnavailableError):
+            http_get(self.url, source="Stub")
+        breaker = get_circuit_breaker("Stub")
+        self.assertEqual(breaker.state, "open")
+
+        # Open: calls fail without reaching the server
+        sent = _ScriptedStub.requests
+        with self.assertRaises(SourceUnavailableError):
+            http_get(self.url, source="Stub")
+        self.assertEqual(_ScriptedStub.requests, sent)
+
+        # Half-open: one trial is let through while further calls are refused
+        breaker._opened_at -= breaker.reset_timeout
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        # A successful trial closes the circuit
+        breaker._opened_at -= breaker.reset_timeout
+        _ScriptedStub.script = [(200, {})]
+        self.assertEqual(http_get(self.url, source="Stub").status_code, 200)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_source_client_error_is_reported(self):
+        _ScriptedStub.script = [(400, {})]
+        url = search_function.ARXIV_API_URL
+        search_function.ARXIV_API_URL = self.url
+        configure_source("ArXiv", rate=None)
+        try:
+            with self.assertRaises(SourceUnavailableError) as raised:
+                list(search_function.iter_arxiv_pages("retrieval", (1900, 2100), max_results=3, page_size=3))
+        finally:
+            search_function.ARXIV_API_URL = url
+            configure_source("ArXiv", *SOURCE_RATE_LIMITS["ArXiv"])
+        self.assertEqual(raised.exception.source, "ArXiv")
+
+class StubServerTest(unittest.TestCase):
+    def setUp(self):
+        _ArxivStub.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ArxivStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = search_function.ARXIV_API_URL
+        search_function.ARXIV_API_URL = f"http://127.0.0.1:{self.server.server_port}/api/query"
+
+    def tearDown(self):
+        search_function.ARXIV_API_URL = self.url
+        self.server.shutdown()
+        self.server.server_close()
+        configure_source("ArXiv", *SOURCE_RATE_LIMITS["ArXiv"])
+
+    def test_default_limit_applies(self):
+        limiter = get_rate_limiter("ArXiv")
+        self.assertEqual(limiter.rate, SOURCE_RATE_LIMITS["ArXiv"][0])
+
+    def test_configure_source_removes_throttling(self):
+        configure_source("ArXiv", rate=None)
+        self.assertIsNone(get_rate_limiter("ArXiv"))
+
+        # Three pages would take at least 6 s at ArXiv's default 1 request per 3 s
+        started = time.monotonic()
+        pages = list(search_function.iter_arxiv_pages("retrieval", (1900, 2100), max_results=9, page_size=3))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(_ArxivStub.requests, 3)
+        self.assertEqual(sum(len(page) for page in pages), 9)
+        self.assertLess(elapsed, 2)
+
+    def test_configure_source_sets_rate(self):
+        configure_source("ArXiv", rate=1000, burst=5)
+        limiter = get_rate_limiter("ArXiv")
+        self.assertEqual((limiter.rate, limiter.burst), (1000, 5))
+        self.assertIs(http_functions.get_rate_limiter("ArXiv"), limiter)
+
+if __name__ == "__main__":
+    unittest.main()